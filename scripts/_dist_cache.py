@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Disk cache for the municipality x station haversine matrices.
+
+The integrate scripts run back to back in the pipeline and recompute
+full distance matrices over the same municipality table on every run;
+caching the matrices as .npy keyed by a digest of the coordinate arrays
+makes reruns skip the trig entirely.
+"""
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from _geo import pairwise_haversine
+
+CACHE_DIR = Path('data/.cache')
+
+def _signature(*arrays):
+    """Fingerprint the coordinate arrays themselves (not file mtimes)."""
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def cached_pairwise(lats1, lons1, lats2, lons2, name):
+    """pairwise_haversine with a best-effort .npy sidecar cache.
+
+    The file name embeds a digest of all four coordinate arrays, so any
+    change to either table misses cleanly; hits are memory-mapped
+    read-only instead of recomputed.
+    """
+    sig = _signature(lats1, lons1, lats2, lons2)
+    path = CACHE_DIR / f'dist_{name}_{sig}.npy'
+    if path.exists():
+        try:
+            return np.load(path, mmap_mode='r')
+        except Exception:
+            pass  # corrupt cache - fall through to recompute
+
+    dists = pairwise_haversine(lats1, lons1, lats2, lons2)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for stale in CACHE_DIR.glob(f'dist_{name}_*.npy'):
+            stale.unlink(missing_ok=True)
+        np.save(path, dists)
+    except OSError:
+        pass  # cache is best-effort
+    return dists
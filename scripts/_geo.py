@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Shared haversine kernels for the municipality/station distance math.
+
+Compiled to a real ufunc with Numba when available (fastmath lets LLVM
+vectorise the trig); the NumPy fallback broadcasts the same expression.
+"""
+
+import math
+
+import numpy as np
+
+try:
+    from numba import vectorize
+except ImportError:
+    # Numba is optional - without it the NumPy expression does the work
+    vectorize = None
+
+if vectorize is not None:
+    # The float32 loop comes first so single-precision coordinate arrays
+    # stay single precision: ~1 m worst-case error over Austria, half the
+    # memory traffic and twice the SIMD lanes of the float64 loop
+    @vectorize(['float32(float32, float32, float32, float32)',
+                'float64(float64, float64, float64, float64)'],
+               fastmath=True, cache=True)
+    def haversine(lat1, lon1, lat2, lon2):
+        """Distance in km; broadcasts over array arguments."""
+        dlat = math.radians(lat2 - lat1)
+        dlon = math.radians(lon2 - lon1)
+        a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+        return 2 * 6371.0 * math.asin(math.sqrt(a))
+else:
+    def haversine(lat1, lon1, lat2, lon2):
+        """Distance in km; broadcasts over array arguments."""
+        R = 6371
+        dlat = np.radians(lat2 - lat1)
+        dlon = np.radians(lon2 - lon1)
+        a = np.sin(dlat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon/2)**2
+        return R * 2 * np.arcsin(np.sqrt(a))
+
+
+def pairwise_haversine(lats1, lons1, lats2, lons2):
+    """(M, S) distance matrix in km via broadcasting."""
+    return haversine(np.asarray(lats1)[:, None], np.asarray(lons1)[:, None],
+                     np.asarray(lats2)[None, :], np.asarray(lons2)[None, :])
@@ -0,0 +1,87 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""Compiled fast path for the daily eHYD 'date;value' section.
+
+This is optional: hydro_io falls back to the pandas C parser when the
+extension has not been built. Build it in place with
+
+    python setup_ext.py build_ext --inplace
+
+run from the scripts/ directory.
+"""
+
+import numpy as np
+
+cimport numpy as cnp
+from libc.stdlib cimport strtod
+
+cnp.import_array()
+
+
+def parse_daily_values(bytes buf):
+    """Parse b'DD.MM.YYYY hh:mm:ss;value;...' lines into (years, vals).
+
+    Returns an int16 year array and a float32 value array of equal
+    length. Rows with a malformed date or a non-numeric value field
+    (e.g. the 'Lücke' gap marker) are skipped.
+    """
+    cdef const char* s = buf
+    cdef Py_ssize_t n = len(buf)
+    cdef Py_ssize_t nmax = buf.count(b'\n') + 1
+    cdef cnp.ndarray[cnp.int16_t, ndim=1] years = np.empty(nmax, dtype=np.int16)
+    cdef cnp.ndarray[cnp.float32_t, ndim=1] vals = np.empty(nmax, dtype=np.float32)
+    cdef cnp.int16_t[:] yv = years
+    cdef cnp.float32_t[:] vv = vals
+
+    cdef Py_ssize_t i = 0, j, k, m, out = 0
+    cdef int year, ok
+    cdef char c
+    cdef char num[64]
+    cdef char* endptr
+    cdef double val
+
+    while i < n:
+        # Line spans [i, j)
+        j = i
+        while j < n and s[j] != b'\n':
+            j += 1
+
+        # "DD.MM.YYYY ...;value;..." - the year sits at fixed offsets 6..9
+        if j - i >= 11 and s[i + 2] == b'.' and s[i + 5] == b'.':
+            ok = 1
+            year = 0
+            for k in range(i + 6, i + 10):
+                c = s[k]
+                if c < b'0' or c > b'9':
+                    ok = 0
+                    break
+                year = year * 10 + (c - b'0')
+            if ok:
+                # First ';' ends the date field
+                k = i + 10
+                while k < j and s[k] != b';':
+                    k += 1
+                if k < j:
+                    k += 1
+                    # Copy the value field, mapping the decimal ',' to '.'
+                    m = 0
+                    while k < j and s[k] != b';' and m < 63:
+                        c = s[k]
+                        if c == b',':
+                            c = b'.'
+                        if c != b' ' and c != b'\r':
+                            num[m] = c
+                            m += 1
+                        k += 1
+                    num[m] = 0
+                    if m > 0:
+                        endptr = NULL
+                        val = strtod(num, &endptr)
+                        # Accept only fully consumed numeric fields, so
+                        # gap markers fall through without a branch per char
+                        if endptr == num + m:
+                            yv[out] = <cnp.int16_t>year
+                            vv[out] = <cnp.float32_t>val
+                            out += 1
+        i = j + 1
+
+    return years[:out], vals[:out]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""mtime-keyed Parquet sidecar cache for parsed eHYD CSV files.
+
+Re-running the analyze_* scripts re-parses every CSV from scratch even
+when nothing changed. Caching the parsed data section as Parquet next to
+the source file makes re-runs I/O-cheap: columnar reads are an order of
+magnitude faster than CSV parsing and compress well with Snappy.
+"""
+
+import json
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow is optional - without it every run parses the CSVs directly
+    pa = pq = None
+
+_META_KEY = b'ehyd_meta'
+
+
+def load_cached(csv_path, parse_func):
+    """Return (meta, df) for csv_path via a Parquet sidecar cache.
+
+    parse_func(csv_path) must return (meta, df) where df is a DataFrame
+    or None. The cache file name embeds the CSV mtime, so edited or
+    re-downloaded files are re-parsed automatically; station metadata
+    rides along as Parquet key-value schema metadata.
+    """
+    if pq is None:
+        return parse_func(csv_path)
+
+    csv_path = Path(csv_path)
+    try:
+        mtime = int(csv_path.stat().st_mtime)
+    except OSError:
+        return parse_func(csv_path)
+
+    cache_dir = csv_path.parent / '.cache'
+    cache_path = cache_dir / f'{csv_path.stem}-{mtime}.parquet'
+
+    if cache_path.exists():
+        try:
+            table = pq.read_table(cache_path)
+            raw = (table.schema.metadata or {}).get(_META_KEY)
+            meta = json.loads(raw) if raw else {}
+            return meta, table.to_pandas()
+        except Exception:
+            pass  # corrupt/stale cache entry - fall through to re-parse
+
+    meta, df = parse_func(csv_path)
+
+    if df is not None:
+        try:
+            cache_dir.mkdir(exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            table = table.replace_schema_metadata(
+                {**(table.schema.metadata or {}),
+                 _META_KEY: json.dumps(meta).encode()})
+            pq.write_table(table, cache_path, compression='snappy')
+        except Exception:
+            pass  # cache is best-effort; never fail the parse over it
+
+    return meta, df
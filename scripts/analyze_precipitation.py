@@ -1,183 +1,176 @@
 #!/usr/bin/env python3
 """Analyze precipitation trends from NLV stations."""
 
-import json
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime
 import numpy as np
+import pandas as pd
+
+from _trend_numba import ols_trend
+from hydro_io import read_hzb_csv
 
 def parse_precip_file(filepath):
-    """Parse a precipitation CSV file."""
-    with open(filepath, 'r', encoding='latin-1') as f:
-        content = f.read().replace('\r\n', '\n').replace('\r', '\n')
-    lines = content.split('\n')
-    
-    meta = {}
-    data_start = 0
-    for i, line in enumerate(lines):
-        if line.startswith('Messstelle:'):
-            meta['name'] = line.split(';')[1].strip()
-        elif line.startswith('HZB-Nummer:'):
-            meta['hzb'] = line.split(';')[1].strip()
-        elif 'he [m' in line and ';' in line:
-            # Height line
-            pass
-        elif 'nge (Grad' in line:  # Länge
-            pass
-        elif line.strip().startswith('01.') and 'g' not in line:
-            # Found coordinates line with date format - next section has coords
-            pass
-        elif line.startswith('Werte:'):
-            data_start = i + 1
-            break
-    
-    # Try to get coordinates from metadata file
-    values = []
-    for line in lines[data_start:]:
-        parts = line.strip().split(';')
-        if len(parts) >= 2 and parts[0].strip():
-            try:
-                date = datetime.strptime(parts[0].strip(), '%d.%m.%Y %H:%M:%S')
-                val = float(parts[1].strip().replace(',', '.'))
-                values.append((date, val))
-            except:
-                continue
-    return meta, values
-
-def calculate_annual_totals(values):
-    """Calculate annual precipitation totals."""
-    by_year = {}
-    for dt, val in values:
-        year = dt.year
-        by_year.setdefault(year, []).append(val)
-    
+    """Parse a precipitation CSV file (shared eHYD reader, Parquet-cached)."""
+    return read_hzb_csv(filepath)
+
+def calculate_annual_totals(df):
+    """Calculate annual precipitation totals as (years, totals) arrays."""
+    yrs = df['year'].to_numpy()
+    vals = df['val'].to_numpy()
+    y0 = yrs.min()
+    idx = yrs - y0
+    cnt = np.bincount(idx)
+    sums = np.bincount(idx, weights=vals)
     # Sum daily values for each year (only complete years with >300 days)
-    annual = {}
-    for year, vals in by_year.items():
-        if len(vals) >= 300:  # At least 300 days of data
-            annual[year] = sum(vals)
-    return annual
+    mask = cnt >= 300
+    years = np.nonzero(mask)[0] + y0
+    totals = sums[mask].astype(np.float32)
+    return years, totals
 
-def calculate_trend(annual):
+def calculate_trend(years, values):
     """Calculate linear trend in mm/decade."""
-    if len(annual) < 10:
+    if len(years) < 10:
         return None, None
-    
-    years = sorted(annual.keys())
-    values = [annual[y] for y in years]
-    
+
     # Sanity check: reasonable annual precipitation (100-5000 mm)
-    values_clean = [(y, v) for y, v in zip(years, values) if 100 < v < 5000]
-    if len(values_clean) < 10:
+    clean = (values > 100) & (values < 5000)
+    if clean.sum() < 10:
         return None, None
-    
-    x = np.array([v[0] for v in values_clean])
-    y = np.array([v[1] for v in values_clean])
-    
-    # Remove outliers (>2 std from mean)
-    mean_y = np.mean(y)
-    std_y = np.std(y)
-    if std_y > 0:
-        mask = np.abs(y - mean_y) < 2 * std_y
-        x, y = x[mask], y[mask]
-    
-    if len(x) < 10:
+
+    x = np.asarray(years, dtype=np.float64)[clean]
+    y = np.asarray(values, dtype=np.float64)[clean]
+
+    # Fused outlier filter + closed-form OLS fit (see _trend_numba)
+    trend_per_decade, mean_precip, _, n_used = ols_trend(x, y)
+
+    if n_used < 10:
         return None, None
-    
-    slope, intercept = np.polyfit(x, y, 1)
-    trend_per_decade = slope * 10  # mm per decade
-    
-    # Mean annual precip
-    mean_precip = np.mean(y)
-    
+
     # Final sanity check on trend
     if abs(trend_per_decade) > 500:  # More than 500mm/decade is unrealistic
         return None, None
-    
+
     return trend_per_decade, mean_precip
 
 def load_station_coords():
-    """Load station coordinates from metadata."""
+    """Load station coordinates from metadata.
+
+    The derived dict is memoized to data/.cache and reused as long as
+    the source CSV is unchanged, skipping the per-station conversion.
+    """
     coords = {}
     meta_file = Path('data/nlv/messstellen_nlv.csv')
+    cache = Path('data/.cache/nlv_coords.json')
+    if cache.exists() and meta_file.exists() \
+            and cache.stat().st_mtime >= meta_file.stat().st_mtime:
+        return orjson.loads(cache.read_bytes())
     if meta_file.exists():
-        with open(meta_file, 'r', encoding='latin-1') as f:
-            lines = f.readlines()
-        # Parse header
-        if lines:
-            header = lines[0].strip().split(';')
-            for line in lines[1:]:
-                parts = line.strip().split(';')
-                if len(parts) >= 10:
-                    try:
-                        hzb = parts[1].strip()
-                        x = float(parts[8].replace(',', '.')) if parts[8] else None
-                        y = float(parts[9].replace(',', '.')) if parts[9] else None
-                        if x and y:
-                            # Convert BMN to approx WGS84
-                            lat = 46 + (y - 150000) / 111000
-                            lon = 9 + (x - 100000) / 75000
-                            coords[hzb] = {'lat': lat, 'lon': lon}
-                    except:
-                        continue
+        df = pd.read_csv(meta_file, sep=';', encoding='latin-1', dtype=str)
+        if df.shape[1] >= 10:
+            x = pd.to_numeric(df.iloc[:, 8].str.replace(',', '.', regex=False),
+                              errors='coerce')
+            y = pd.to_numeric(df.iloc[:, 9].str.replace(',', '.', regex=False),
+                              errors='coerce')
+            valid = x.notna() & y.notna() & (x != 0) & (y != 0)
+
+            # Convert BMN to approx WGS84, vectorised over all stations
+            coords = pd.DataFrame({
+                'lat': 46 + (y[valid] - 150000) / 111000,
+                'lon': 9 + (x[valid] - 100000) / 75000,
+            }, index=df.iloc[:, 1][valid].str.strip()).to_dict('index')
+        cache.parent.mkdir(exist_ok=True)
+        cache.write_bytes(orjson.dumps(coords))
     return coords
 
+# Worker-process state, set once per worker instead of pickled per task
+_coords = {}
+
+def _init_worker(coords):
+    global _coords
+    _coords = coords
+
+def process_one(filepath):
+    """Parse and trend a single precipitation file (runs in a worker process)."""
+    meta, df = parse_precip_file(filepath)
+    if df is None or df.empty:
+        return None
+
+    annual_years, annual_totals = calculate_annual_totals(df)
+    trend, mean_precip = calculate_trend(annual_years, annual_totals)
+
+    if trend is None or not meta.get('hzb'):
+        return None
+
+    hzb = meta['hzb']
+    coord = _coords.get(hzb, {})
+
+    metadata = {
+        'station': meta.get('name', 'Unknown'),
+        'hzb': hzb,
+        'lat': coord.get('lat'),
+        'lon': coord.get('lon'),
+    }
+    return metadata, (mean_precip, trend, len(annual_years))
+
 def main():
     precip_dir = Path('data/nlv/N-Tagessummen')
     coords = load_station_coords()
-    
-    results = []
-    processed = 0
-    
-    for f in sorted(precip_dir.glob('*.csv')):
-        meta, values = parse_precip_file(f)
-        if not values:
-            continue
-        
-        annual = calculate_annual_totals(values)
-        trend, mean_precip = calculate_trend(annual)
-        
-        if trend is not None and meta.get('hzb'):
-            hzb = meta['hzb']
-            coord = coords.get(hzb, {})
-            
-            results.append({
-                'station': meta.get('name', 'Unknown'),
-                'hzb': hzb,
-                'lat': coord.get('lat'),
-                'lon': coord.get('lon'),
-                'mean_annual_mm': round(mean_precip, 0),
-                'trend_mm_decade': round(trend, 1),
-                'trend_pct_decade': round(trend / mean_precip * 100, 1) if mean_precip > 0 else 0,
-                'years_data': len(annual)
-            })
-            processed += 1
-    
+
+    # Each file is parsed and trended independently - fan out over cores
+    with ProcessPoolExecutor(initializer=_init_worker,
+                             initargs=(coords,)) as ex:
+        rows = [r for r in ex.map(process_one, precip_dir.glob('*.csv'),
+                                  chunksize=32) if r]
+    processed = len(rows)
+
+    # SoA layout: the numeric columns live in typed arrays with the string
+    # metadata in a parallel list, so sorting and summary stats are array
+    # ops instead of per-dict Python loops
+    metadata = [m for m, _ in rows]
+    mean_mm = np.array([n[0] for _, n in rows], dtype=np.float32)
+    trend_mm = np.array([n[1] for _, n in rows], dtype=np.float32)
+    years_data = np.array([n[2] for _, n in rows], dtype=np.int16)
+    trend_pct = np.where(mean_mm > 0, trend_mm / mean_mm * 100, 0)
+
     # Sort by trend
-    results.sort(key=lambda x: x['trend_mm_decade'])
-    
+    order = np.argsort(trend_mm, kind='stable')
+    metadata = [metadata[i] for i in order]
+    mean_mm, trend_mm, years_data, trend_pct = (
+        mean_mm[order], trend_mm[order], years_data[order], trend_pct[order])
+
     print(f"Analyzed {processed} precipitation stations:")
     print(f"{'Station':<25} {'Mean mm':>10} {'Trend mm/dec':>12} {'Trend %':>10}")
     print("-" * 60)
-    
+
     # Show driest trends (most declining)
     print("\nMost declining:")
-    for r in results[:10]:
-        print(f"{r['station'][:24]:<25} {r['mean_annual_mm']:>10.0f} {r['trend_mm_decade']:>+12.1f} {r['trend_pct_decade']:>+10.1f}%")
-    
+    for i in range(min(10, processed)):
+        print(f"{metadata[i]['station'][:24]:<25} {mean_mm[i]:>10.0f} {trend_mm[i]:>+12.1f} {trend_pct[i]:>+10.1f}%")
+
     print("\nMost increasing:")
-    for r in results[-10:]:
-        print(f"{r['station'][:24]:<25} {r['mean_annual_mm']:>10.0f} {r['trend_mm_decade']:>+12.1f} {r['trend_pct_decade']:>+10.1f}%")
-    
+    for i in range(max(0, processed - 10), processed):
+        print(f"{metadata[i]['station'][:24]:<25} {mean_mm[i]:>10.0f} {trend_mm[i]:>+12.1f} {trend_pct[i]:>+10.1f}%")
+
     # Summary stats
-    trends = [r['trend_mm_decade'] for r in results]
-    declining = len([t for t in trends if t < 0])
-    print(f"\nSummary: {declining}/{len(results)} stations show declining precipitation")
-    print(f"Mean trend: {np.mean(trends):+.1f} mm/decade")
-    
-    # Save
-    Path('data/precipitation_analysis.json').write_text(json.dumps(results, indent=2))
+    declining = int((trend_mm < 0).sum())
+    print(f"\nSummary: {declining}/{processed} stations show declining precipitation")
+    print(f"Mean trend: {trend_mm.mean():+.1f} mm/decade")
+
+    # Save - per-station dicts are materialised only here, at emit time
+    results = [
+        {**m,
+         'mean_annual_mm': round(float(mean_mm[i]), 0),
+         'trend_mm_decade': round(float(trend_mm[i]), 1),
+         'trend_pct_decade': round(float(trend_pct[i]), 1),
+         'years_data': int(years_data[i])}
+        for i, m in enumerate(metadata)
+    ]
+    Path('data/precipitation_analysis.json').write_bytes(
+        orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     print(f"\nSaved to data/precipitation_analysis.json")
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
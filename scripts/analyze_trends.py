@@ -4,62 +4,30 @@ Analyze groundwater and hydrological trends from eHYD data.
 This processes a sample of stations to compute actual trends.
 """
 
-import os
-import json
-import re
+import orjson
 from pathlib import Path
-import pandas as pd
 import numpy as np
-from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from scipy import stats
+
+from _trend_numba import ols_fit
+from hydro_io import read_hzb_monthly
+
 DATA_DIR = Path('../data')
 OUTPUT_DIR = Path('../web/data')
 
+def load_json(path):
+    """Read a JSON file via orjson (noticeably faster than json.load)."""
+    return orjson.loads(Path(path).read_bytes())
+
 def parse_ehyd_monthly(filepath):
-    """Parse eHYD monthly CSV files."""
-    try:
-        with open(filepath, 'r', encoding='latin-1') as f:
-            lines = f.readlines()
-        
-        # Find data start
-        data_start = 0
-        for i, line in enumerate(lines):
-            if line.strip().startswith('01.'):
-                data_start = i
-                break
-        
-        dates = []
-        values = []
-        
-        for line in lines[data_start:]:
-            line = line.strip()
-            if not line or 'L\xfccke' in line or 'Lücke' in line:
-                continue
-            
-            parts = line.split(';')
-            if len(parts) >= 2:
-                try:
-                    date_str = parts[0].strip()
-                    date_match = re.match(r'(\d{2}\.\d{2}\.\d{4})', date_str)
-                    if date_match:
-                        date = pd.to_datetime(date_match.group(1), format='%d.%m.%Y')
-                        
-                        val_str = parts[1].strip().replace(',', '.')
-                        val_str = re.sub(r'[^0-9.\-]', '', val_str)
-                        if val_str:
-                            val = float(val_str)
-                            dates.append(date)
-                            values.append(val)
-                except:
-                    continue
-        
-        if len(dates) > 100:
-            return pd.Series(values, index=pd.DatetimeIndex(dates))
-        return None
-    except Exception as e:
+    """Parse eHYD monthly CSV files (shared eHYD reader, Parquet-cached)."""
+    df = read_hzb_monthly(filepath)
+    if df is None:
         return None
+    return df['val']
 
 def calculate_trend(series):
     """Calculate trend per decade using linear regression."""
@@ -67,28 +35,34 @@ def calculate_trend(series):
         return None, None, None
     
     try:
-        # Resample to annual means
-        annual = series.resample('Y').mean().dropna()
+        # Aggregate to annual means via bincount - far cheaper than
+        # resample('Y') machinery on ~120 monthly values
+        yrs = series.index.year.to_numpy()
+        vals = series.to_numpy()
+        idx = yrs - yrs.min()
+        cnt = np.bincount(idx)
+        sums = np.bincount(idx, weights=vals)
+        annual = sums[cnt > 0] / cnt[cnt > 0]
         if len(annual) < 10:
             return None, None, None
-        
+
         # Check for realistic groundwater values (50-800m above sea level typical for Austria)
         mean_val = annual.mean()
         if mean_val < 50 or mean_val > 2000:
             return None, None, None
-        
+
         # Check for reasonable variance (not flat or wild)
-        std_val = annual.std()
+        std_val = annual.std(ddof=1)
         if std_val > 50 or std_val < 0.01:
             return None, None, None
-        
-        x = np.arange(len(annual))
-        y = annual.values
-        
-        # Linear fit
-        from scipy import stats
-        slope, intercept, r, p, se = stats.linregress(x, y)
-        
+
+        x = np.arange(len(annual), dtype=np.float64)
+        y = annual
+
+        # Closed-form linear fit; p-value from the t-statistic
+        slope, intercept, t_stat = ols_fit(x, y)
+        p = float(2.0 * stats.t.sf(abs(t_stat), len(annual) - 2))
+
         # Trend per decade (realistic range: -2 to +2 m/decade)
         trend_per_decade = slope * 10
         if abs(trend_per_decade) > 5:  # Filter unrealistic trends
@@ -107,48 +81,51 @@ def calculate_trend(series):
     except:
         return None, None, None
 
+def process_one_station(f):
+    """Parse and trend a single station file (runs in a worker process)."""
+    station_id = f.stem.split('-')[-1]
+    series = parse_ehyd_monthly(f)
+
+    if series is None:
+        return None
+
+    trend, p_val, change = calculate_trend(series)
+
+    if trend is None:
+        return None
+
+    return {
+        'station_id': station_id,
+        'trend_m_per_decade': round(trend, 4),
+        'p_value': round(p_val, 4) if p_val else None,
+        'change_pct': round(change, 2) if change else 0,
+        'data_years': len(series) / 12,
+        'mean_level': round(series.mean(), 2),
+        'current_level': round(series[-12:].mean(), 2) if len(series) >= 12 else None
+    }
+
 def process_groundwater_trends():
     """Process groundwater trends from monthly data."""
     print("Analyzing groundwater trends...")
-    
+
     gw_dir = DATA_DIR / 'gw' / 'Grundwasserstand-Monatsmittel'
     if not gw_dir.exists():
         print(f"  Directory not found: {gw_dir}")
         return []
-    
-    files = list(gw_dir.glob('*.csv'))[:500]  # Limit for speed
-    print(f"  Processing {len(files)} files...")
-    
-    results = []
-    declining = 0
-    rising = 0
-    
-    for i, f in enumerate(files):
-        if i % 100 == 0:
-            print(f"    {i}/{len(files)}...")
-        
-        station_id = f.stem.split('-')[-1]
-        series = parse_ehyd_monthly(f)
-        
-        if series is not None:
-            trend, p_val, change = calculate_trend(series)
-            
-            if trend is not None:
-                results.append({
-                    'station_id': station_id,
-                    'trend_m_per_decade': round(trend, 4),
-                    'p_value': round(p_val, 4) if p_val else None,
-                    'change_pct': round(change, 2) if change else 0,
-                    'data_years': len(series) / 12,
-                    'mean_level': round(series.mean(), 2),
-                    'current_level': round(series[-12:].mean(), 2) if len(series) >= 12 else None
-                })
-                
-                if trend < 0:
-                    declining += 1
-                else:
-                    rising += 1
-    
+
+    # Each file is independent - fan out over cores. The glob iterator
+    # is consumed lazily by the pool, so workers start before directory
+    # enumeration completes
+    print(f"  Processing {gw_dir}...")
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor() as ex:
+        results = [r for r in ex.map(process_one_station, gw_dir.glob('*.csv'),
+                                     chunksize=16) if r]
+
+    declining = sum(1 for r in results if r['trend_m_per_decade'] < 0)
+    rising = len(results) - declining
+
     print(f"  Analyzed {len(results)} stations")
     print(f"    Declining: {declining}")
     print(f"    Rising: {rising}")
@@ -160,8 +137,7 @@ def merge_trends_with_stations():
     print("Merging trends with station data...")
     
     # Load existing station data
-    with open(OUTPUT_DIR / 'gw_stations.json', 'r') as f:
-        stations = json.load(f)
+    stations = load_json(OUTPUT_DIR / 'gw_stations.json')
     
     station_lookup = {s['id']: s for s in stations}
     
@@ -176,8 +152,8 @@ def merge_trends_with_stations():
     
     # Save merged data
     merged = list(station_lookup.values())
-    with open(OUTPUT_DIR / 'gw_stations_trends.json', 'w') as f:
-        json.dump(merged, f)
+    (OUTPUT_DIR / 'gw_stations_trends.json').write_bytes(
+        orjson.dumps(merged, option=orjson.OPT_SERIALIZE_NUMPY))
     
     print(f"  Saved {len(merged)} stations with trend data")
     return merged
@@ -187,52 +163,53 @@ def update_municipality_risk(gw_data):
     print("Updating municipality risk scores...")
     
     # Load municipalities
-    with open(OUTPUT_DIR / 'municipalities.json', 'r') as f:
-        municipalities = json.load(f)
-    
-    # Create station lookup by location
-    gw_by_loc = {}
-    for s in gw_data:
-        if 'trend_m_per_decade' in s:
-            key = f"{s['lat']:.2f},{s['lon']:.2f}"
-            if key not in gw_by_loc:
-                gw_by_loc[key] = []
-            gw_by_loc[key].append(s)
+    municipalities = load_json(OUTPUT_DIR / 'municipalities.json')
     
-    # Update each municipality
-    for muni in municipalities:
-        # Find nearby stations
-        nearby_trends = []
-        for key, stations in gw_by_loc.items():
-            parts = key.split(',')
-            slat, slon = float(parts[0]), float(parts[1])
-            dist = ((muni['lat'] - slat)**2 + (muni['lon'] - slon)**2)**0.5
-            if dist < 0.2:  # ~15km
-                for s in stations:
-                    if 'trend_m_per_decade' in s:
-                        nearby_trends.append(s['trend_m_per_decade'])
-        
-        if nearby_trends:
-            avg_trend = np.mean(nearby_trends)
-            muni['gw_trend'] = round(avg_trend, 4)
-            
-            # Update risk score
-            # Negative trend = declining groundwater = higher risk
-            gw_risk = max(0, min(1, -avg_trend / 0.5))  # Normalize: -0.5m/decade = risk 1
-            
-            # Combine with hydro risk
-            hydro_risk = muni.get('hydro_risk', 0)
-            muni['gw_risk'] = round(gw_risk, 3)
-            muni['risk_score'] = round(0.5 * gw_risk + 0.5 * hydro_risk, 3)
-            muni['risk_category'] = 'high' if muni['risk_score'] > 0.6 else ('medium' if muni['risk_score'] > 0.3 else 'low')
+    # Build a KD-tree over stations with trends - one vectorised radius
+    # query replaces the municipality x station Python double loop
+    from scipy.spatial import cKDTree
+
+    stations = [s for s in gw_data
+                if 'trend_m_per_decade' in s and s.get('lat') and s.get('lon')]
+    station_coords = np.array([[s['lat'], s['lon']] for s in stations])
+    station_trends = np.array([s['trend_m_per_decade'] for s in stations])
+
+    muni_coords = np.array([[m['lat'], m['lon']] for m in municipalities])
+    if len(stations):
+        tree = cKDTree(station_coords)
+        neighbors = tree.query_ball_point(muni_coords, r=0.2)  # ~15km
+    else:
+        # No stations with trends (e.g. missing data directory): keep
+        # one empty neighbor list per municipality so the array math
+        # below stays shape-(N,) and simply yields all-NaN trends
+        neighbors = [[] for _ in municipalities]
+
+    # Compute the risk columns as whole-array operations; only the final
+    # writeback into the municipality dicts stays a (cheap) Python loop
+    avg_trend = np.array([station_trends[nearby].mean() if len(nearby) else np.nan
+                          for nearby in neighbors])
+    hydro_risk = np.array([m.get('hydro_risk', 0) for m in municipalities])
+
+    # Negative trend = declining groundwater = higher risk
+    # Normalize: -0.5m/decade = risk 1
+    gw_risk = np.clip(-avg_trend / 0.5, 0, 1)
+    risk_score = 0.5 * gw_risk + 0.5 * hydro_risk
+    category = np.where(risk_score > 0.6, 'high',
+                        np.where(risk_score > 0.3, 'medium', 'low'))
+
+    for i in np.nonzero(~np.isnan(avg_trend))[0]:
+        muni = municipalities[i]
+        muni['gw_trend'] = round(float(avg_trend[i]), 4)
+        muni['gw_risk'] = round(float(gw_risk[i]), 3)
+        muni['risk_score'] = round(float(risk_score[i]), 3)
+        muni['risk_category'] = str(category[i])
     
     # Save updated municipalities
-    with open(OUTPUT_DIR / 'municipalities.json', 'w') as f:
-        json.dump(municipalities, f)
+    (OUTPUT_DIR / 'municipalities.json').write_bytes(
+        orjson.dumps(municipalities, option=orjson.OPT_SERIALIZE_NUMPY))
     
     # Update GeoJSON
-    with open(OUTPUT_DIR / 'municipalities_risk.geojson', 'r') as f:
-        geojson = json.load(f)
+    geojson = load_json(OUTPUT_DIR / 'municipalities_risk.geojson')
     
     muni_lookup = {m['iso']: m for m in municipalities}
     for feature in geojson['features']:
@@ -240,8 +217,8 @@ def update_municipality_risk(gw_data):
         if iso in muni_lookup:
             feature['properties'].update(muni_lookup[iso])
     
-    with open(OUTPUT_DIR / 'municipalities_risk.geojson', 'w') as f:
-        json.dump(geojson, f)
+    (OUTPUT_DIR / 'municipalities_risk.geojson').write_bytes(
+        orjson.dumps(geojson, option=orjson.OPT_SERIALIZE_NUMPY))
     
     # Stats
     high_risk = sum(1 for m in municipalities if m.get('risk_category') == 'high')
@@ -255,4 +232,6 @@ def main():
     print("\nTrend analysis complete!")
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
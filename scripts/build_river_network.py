@@ -1,41 +1,27 @@
 #!/usr/bin/env python3
 """Build river network from OWF station data."""
 
-import csv
 import json
 from pathlib import Path
-from collections import defaultdict
+
+import pandas as pd
+
+from hydro_io import load_owf_meta
 
 def load_owf_stations():
-    """Load surface water station metadata."""
-    stations = []
-    with open('data/owf/messstellen_owf.csv', 'r', encoding='latin-1') as f:
-        reader = csv.DictReader(f, delimiter=';')
-        for row in reader:
-            try:
-                stations.append({
-                    'id': row['hzbnr01'],
-                    'name': row['mstnam02'],
-                    'river': row['gew03'],
-                    'km': float(row['mpua04'].replace(',', '.')) if row['mpua04'] else None,
-                    'catchment_km2': float(row['egarea05'].replace(',', '.')) if row['egarea05'] else None,
-                    'x': float(row['xrkko08'].replace(',', '.')) if row['xrkko08'] else None,
-                    'y': float(row['yhkko09'].replace(',', '.')) if row['yhkko09'] else None,
-                })
-            except (ValueError, KeyError) as e:
-                continue
-    return stations
+    """Load surface water station metadata (shared Parquet-cached reader)."""
+    df = load_owf_meta()
+    # NaN -> None so downstream 'is not None' checks keep working
+    return df.astype(object).where(df.notna(), None).to_dict('records')
 
 def build_river_dict(stations):
-    """Group stations by river."""
-    rivers = defaultdict(list)
-    for s in stations:
-        if s['river'] and s['km'] is not None:
-            rivers[s['river']].append(s)
-    # Sort by km (river position)
-    for river in rivers:
-        rivers[river].sort(key=lambda x: x['km'])
-    return dict(rivers)
+    """Group stations by river, ordered by km (river position)."""
+    df = pd.DataFrame(stations)
+    df = df[df['river'].notna() & (df['river'] != '') & df['km'].notna()]
+    # One C-level sort over (river, km) replaces a Python sort per river
+    df = df.sort_values(['river', 'km'], kind='stable')
+    return {river: sub.to_dict('records')
+            for river, sub in df.groupby('river', sort=False)}
 
 def identify_major_rivers(rivers):
     """Identify major Austrian rivers."""
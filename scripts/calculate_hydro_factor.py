@@ -5,77 +5,85 @@
 - Local groundwater conditions
 """
 
-import json
-import math
+import orjson
 from pathlib import Path
 
-def haversine(lat1, lon1, lat2, lon2):
-    """Distance in km."""
+import numpy as np
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance in km, vectorised over NumPy arrays."""
     R = 6371
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return R * 2 * math.asin(math.sqrt(a))
+    dlat = np.radians(lat2 - lat1)
+    dlon = np.radians(lon2 - lon1)
+    a = np.sin(dlat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon/2)**2
+    return R * 2 * np.arcsin(np.sqrt(a))
 
 def load_data():
-    muni = json.loads(Path('web/data/municipalities.json').read_text())
-    plants = json.loads(Path('web/data/powerplants.json').read_text())
-    river_impact = json.loads(Path('data/river_hydro_impact.json').read_text())
+    muni = orjson.loads(Path('web/data/municipalities.json').read_bytes())
+    plants = orjson.loads(Path('web/data/powerplants.json').read_bytes())
+    river_impact = orjson.loads(Path('data/river_hydro_impact.json').read_bytes())
     return muni, plants, river_impact
 
-def calculate_nearby_hydro(muni, plants, max_dist_km=30):
-    """Find plants within distance and calculate weighted impact."""
+def plant_arrays(plants):
+    """Precompute plant columns as NumPy arrays for the distance math."""
     impact_weights = {
         'Laufkraftwerk': 0.3,
         'Speicherkraftwerk': 0.7,
         'Pumpspeicherkraftwerk': 0.5,
     }
-    
-    total_impact = 0
-    nearby_count = 0
-    
-    for p in plants:
-        dist = haversine(muni['lat'], muni['lon'], p['lat'], p['lon'])
-        if dist <= max_dist_km:
-            # Distance decay: closer = more impact
-            decay = max(0, 1 - (dist / max_dist_km))
-            mw = p.get('mw', 0) or 0
-            ptype = p.get('type', 'Unknown')
-            weight = impact_weights.get(ptype, 0.4)
-            total_impact += mw * weight * decay
-            nearby_count += 1
-    
-    return total_impact, nearby_count
+    lat = np.array([p['lat'] for p in plants], dtype=np.float64)
+    lon = np.array([p['lon'] for p in plants], dtype=np.float64)
+    mw = np.array([p.get('mw', 0) or 0 for p in plants], dtype=np.float64)
+    weight = np.array([impact_weights.get(p.get('type', 'Unknown'), 0.4)
+                       for p in plants], dtype=np.float64)
+    return lat, lon, mw, weight
+
+def calculate_nearby_hydro(muni, plat, plon, pmw, pweight, max_dist_km=30):
+    """Find plants within distance and calculate weighted impact.
+
+    One vectorised distance computation against all plants replaces the
+    per-plant Python haversine calls.
+    """
+    dist = haversine_km(muni['lat'], muni['lon'], plat, plon)
+    mask = dist <= max_dist_km
+
+    # Distance decay: closer = more impact
+    decay = 1 - dist[mask] / max_dist_km
+    total_impact = float((pmw[mask] * pweight[mask] * decay).sum())
+
+    return total_impact, int(mask.sum())
 
 def main():
     muni, plants, river_impact = load_data()
-    
+    plat, plon, pmw, pweight = plant_arrays(plants)
+
     # Calculate hydro factor for each municipality
     results = []
     for m in muni:
-        impact, count = calculate_nearby_hydro(m, plants)
-        
+        impact, count = calculate_nearby_hydro(m, plat, plon, pmw, pweight)
+
         # Normalize: 500 MW weighted impact = 1.0 factor
         hydro_factor = min(1.0, impact / 500)
-        
+
         results.append({
             **m,
             'hydro_factor': round(hydro_factor, 3),
             'nearby_hydro_plants': count,
             'weighted_hydro_impact': round(impact, 1)
         })
-    
+
     # Sort by hydro_factor
     results.sort(key=lambda x: x['hydro_factor'], reverse=True)
-    
+
     print("Top 20 municipalities by hydro_factor:")
     print(f"{'Municipality':<25} {'Factor':>8} {'Plants':>8} {'Impact':>10}")
     print("-" * 55)
     for r in results[:20]:
         print(f"{r['name'][:24]:<25} {r['hydro_factor']:>8.3f} {r['nearby_hydro_plants']:>8} {r['weighted_hydro_impact']:>10.1f}")
-    
+
     # Save updated municipalities
-    Path('web/data/municipalities_hydro.json').write_text(json.dumps(results, indent=2))
+    Path('web/data/municipalities_hydro.json').write_bytes(
+        orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     print(f"\nSaved to web/data/municipalities_hydro.json")
 
 if __name__ == '__main__':
@@ -1,96 +1,134 @@
 #!/usr/bin/env python3
 """Calculate final hydro_factor combining all data sources."""
 
-import json
 import math
 from pathlib import Path
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return R * 2 * math.asin(math.sqrt(a))
+import orjson
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # Numba is optional - without it the kernel runs as plain Python
+    from _trend_numba import njit
+    prange = range
+
+from hydro_io import load_owf_meta
 
 def load_all_data():
-    muni = json.loads(Path('web/data/municipalities.json').read_text())
-    plants = json.loads(Path('web/data/powerplants.json').read_text())
-    sediment = json.loads(Path('data/sediment_analysis.json').read_text())
-    owf_meta = []
-    with open('data/owf/messstellen_owf.csv', 'r', encoding='latin-1') as f:
-        import csv
-        reader = csv.DictReader(f, delimiter=';')
-        for row in reader:
-            try:
-                owf_meta.append({
-                    'id': row['hzbnr01'],
-                    'name': row['mstnam02'],
-                    'river': row['gew03'],
-                    'x': float(row['xrkko08'].replace(',', '.')) if row['xrkko08'] else None,
-                    'y': float(row['yhkko09'].replace(',', '.')) if row['yhkko09'] else None,
-                })
-            except:
-                continue
+    muni = orjson.loads(Path('web/data/municipalities.json').read_bytes())
+    plants = orjson.loads(Path('web/data/powerplants.json').read_bytes())
+    sediment = orjson.loads(Path('data/sediment_analysis.json').read_bytes())
+    # Shared Parquet-cached metadata reader; NaN -> None so the truthiness
+    # checks on x/y keep working
+    df = load_owf_meta()[['id', 'name', 'river', 'x', 'y']]
+    owf_meta = df.astype(object).where(df.notna(), None).to_dict('records')
     return muni, plants, sediment, owf_meta
 
-def calculate_factor(m, plants, sediment, owf_meta):
+def plant_arrays(plants):
+    """Precompute plant columns as NumPy arrays for the kernel."""
     impact_weights = {'Laufkraftwerk': 0.3, 'Speicherkraftwerk': 0.7, 'Pumpspeicherkraftwerk': 0.5}
-    
-    # 1. Nearby hydropower impact (30km radius)
-    hydro_impact = 0
-    for p in plants:
-        dist = haversine(m['lat'], m['lon'], p['lat'], p['lon'])
-        if dist <= 30:
-            decay = max(0, 1 - (dist / 30))
-            mw = p.get('mw', 0) or 0
-            weight = impact_weights.get(p.get('type', ''), 0.4)
-            hydro_impact += mw * weight * decay
-    
-    # 2. Sediment trends (negative trend = less sediment = bad for groundwater)
-    # Find nearby sediment stations
-    sed_factor = 0
+    lat = np.array([p['lat'] for p in plants], dtype=np.float64)
+    lon = np.array([p['lon'] for p in plants], dtype=np.float64)
+    mw = np.array([p.get('mw', 0) or 0 for p in plants], dtype=np.float64)
+    weight = np.array([impact_weights.get(p.get('type', ''), 0.4)
+                       for p in plants], dtype=np.float64)
+    return lat, lon, mw, weight
+
+def join_sediment_coords(sediment, owf_meta):
+    """Join sediment stations to OWF metadata by HZB number, once.
+
+    Pre-joining here removes the sediment x owf inner scan that used to
+    run for every municipality; only matched stations reach the kernel.
+    """
+    owf_by_id = {o['id']: o for o in owf_meta if o['x'] and o['y']}
+    lat, lon, trend = [], [], []
     for s in sediment:
-        # Match to OWF stations for coordinates
-        for owf in owf_meta:
-            if owf['id'] == s['hzb'] and owf['x'] and owf['y']:
-                # Convert BMN to approx lat/lon
-                lat_approx = 46 + (owf['y'] - 150000) / 111000
-                lon_approx = 9 + (owf['x'] - 100000) / 75000
-                dist = haversine(m['lat'], m['lon'], lat_approx, lon_approx)
-                if dist <= 50:
-                    # Negative trend = more impact
-                    sed_factor += max(0, -s['trend_pct'] / 100) * (1 - dist/50)
-                break
-    
-    # Combine: hydro_impact normalized to 500 MW, sediment factor as modifier
-    base_factor = min(1.0, hydro_impact / 500)
-    final_factor = min(1.0, base_factor * (1 + sed_factor * 0.2))
-    
-    return round(final_factor, 3), round(hydro_impact, 1), round(sed_factor, 3)
+        owf = owf_by_id.get(s['hzb'])
+        if owf:
+            # Convert BMN to approx lat/lon
+            lat.append(46 + (owf['y'] - 150000) / 111000)
+            lon.append(9 + (owf['x'] - 100000) / 75000)
+            trend.append(s['trend_pct'])
+    return (np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64),
+            np.array(trend, dtype=np.float64))
+
+@njit(cache=True)
+def _haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+    return R * 2 * math.asin(math.sqrt(a))
+
+@njit(cache=True, parallel=True)
+def _calculate_factors(mlat, mlon, plat, plon, pmw, pweight, slat, slon, strend):
+    """Per-municipality (final_factor, hydro_impact, sed_factor) rows.
+
+    Pure scalar math over flat arrays - Numba parallelises the outer
+    municipality loop and compiles the haversine inline.
+    """
+    out = np.empty((mlat.shape[0], 3))
+    for i in prange(mlat.shape[0]):
+        # 1. Nearby hydropower impact (30km radius)
+        hydro_impact = 0.0
+        for j in range(plat.shape[0]):
+            dist = _haversine(mlat[i], mlon[i], plat[j], plon[j])
+            if dist <= 30.0:
+                hydro_impact += pmw[j] * pweight[j] * (1.0 - dist / 30.0)
+
+        # 2. Sediment trends (negative trend = less sediment = bad for groundwater)
+        sed_factor = 0.0
+        for j in range(slat.shape[0]):
+            dist = _haversine(mlat[i], mlon[i], slat[j], slon[j])
+            if dist <= 50.0:
+                # Negative trend = more impact
+                t = -strend[j] / 100.0
+                if t > 0.0:
+                    sed_factor += t * (1.0 - dist / 50.0)
+
+        # Combine: hydro_impact normalized to 500 MW, sediment factor as modifier
+        base_factor = min(1.0, hydro_impact / 500.0)
+        final_factor = min(1.0, base_factor * (1.0 + sed_factor * 0.2))
+
+        out[i, 0] = final_factor
+        out[i, 1] = hydro_impact
+        out[i, 2] = sed_factor
+    return out
 
 def main():
     muni, plants, sediment, owf_meta = load_all_data()
-    
+
+    mlat = np.array([m['lat'] for m in muni], dtype=np.float64)
+    mlon = np.array([m['lon'] for m in muni], dtype=np.float64)
+    plat, plon, pmw, pweight = plant_arrays(plants)
+    slat, slon, strend = join_sediment_coords(sediment, owf_meta)
+
+    factors = _calculate_factors(mlat, mlon, plat, plon, pmw, pweight,
+                                 slat, slon, strend)
+
     results = []
-    for m in muni:
-        factor, impact, sed = calculate_factor(m, plants, sediment, owf_meta)
+    for m, row in zip(muni, factors):
         results.append({
             **m,
-            'hydro_factor': factor,
-            'hydro_impact_score': impact,
-            'sediment_modifier': sed
+            'hydro_factor': round(float(row[0]), 3),
+            'hydro_impact_score': round(float(row[1]), 1),
+            'sediment_modifier': round(float(row[2]), 3)
         })
-    
+
     results.sort(key=lambda x: x['hydro_factor'], reverse=True)
-    
+
     print("Top 15 by final hydro_factor:")
     print(f"{'Municipality':<22} {'Factor':>8} {'Impact':>10} {'Sed.Mod':>8}")
     print("-" * 52)
     for r in results[:15]:
         print(f"{r['name'][:21]:<22} {r['hydro_factor']:>8.3f} {r['hydro_impact_score']:>10.1f} {r['sediment_modifier']:>+8.3f}")
-    
-    # Save back to municipalities.json
-    Path('web/data/municipalities.json').write_text(json.dumps(results, indent=2, ensure_ascii=False))
+
+    # Save back to municipalities.json (orjson emits UTF-8, no escaping)
+    Path('web/data/municipalities.json').write_bytes(
+        orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     print(f"\nUpdated web/data/municipalities.json")
 
 if __name__ == '__main__':
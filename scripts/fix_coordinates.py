@@ -4,7 +4,7 @@ Fix groundwater station coordinates.
 Converts from MGI Austria Lambert (EPSG:31287) to WGS84 (EPSG:4326).
 """
 
-import json
+import orjson
 import pandas as pd
 from pathlib import Path
 from pyproj import Transformer
@@ -22,40 +22,33 @@ def parse_gw_stations_correct():
     
     stations = []
     try:
-        df = pd.read_csv(gw_file, sep=';', encoding='latin-1')
-        
-        for _, row in df.iterrows():
-            try:
-                station_id = str(row.get('hzbnr01', ''))
-                name = str(row.get('mstnam02', ''))
-                x = row.get('xrkko09')
-                y = row.get('yhkko10')
-                
-                if pd.isna(x) or pd.isna(y):
-                    continue
-                    
-                # Convert string coords
-                if isinstance(x, str):
-                    x = float(x.replace(',', '.'))
-                if isinstance(y, str):
-                    y = float(y.replace(',', '.'))
-                
-                # Transform from MGI Austria Lambert to WGS84
-                lon, lat = transformer.transform(x, y)
-                
-                # Validate Austria bounds
-                if 9.5 < lon < 17.2 and 46.4 < lat < 49.0:
-                    stations.append({
-                        'id': station_id,
-                        'name': name,
-                        'lon': round(lon, 5),
-                        'lat': round(lat, 5),
-                        'area': str(row.get('gwgeb03', '')),
-                        'body': str(row.get('gwkoerpe04', ''))
-                    })
-            except Exception as e:
-                continue
-                
+        df = pd.read_csv(gw_file, sep=';', encoding='latin-1', dtype=str)
+
+        # Clean coordinate columns as whole-column string ops
+        x = pd.to_numeric(df['xrkko09'].str.replace(',', '.', regex=False),
+                          errors='coerce')
+        y = pd.to_numeric(df['yhkko10'].str.replace(',', '.', regex=False),
+                          errors='coerce')
+        valid = x.notna() & y.notna()
+        df, x, y = df[valid], x[valid], y[valid]
+
+        # Transform from MGI Austria Lambert to WGS84 - one array call sets
+        # up the PROJ pipeline once instead of per row
+        lon, lat = transformer.transform(x.to_numpy(), y.to_numpy())
+
+        # Validate Austria bounds
+        mask = (lon > 9.5) & (lon < 17.2) & (lat > 46.4) & (lat < 49.0)
+
+        out = pd.DataFrame({
+            'id': df['hzbnr01'].fillna('').to_numpy(),
+            'name': df['mstnam02'].fillna('').to_numpy(),
+            'lon': lon.round(5),
+            'lat': lat.round(5),
+            'area': df.get('gwgeb03', pd.Series('', index=df.index)).fillna('').to_numpy(),
+            'body': df.get('gwkoerpe04', pd.Series('', index=df.index)).fillna('').to_numpy(),
+        })
+        stations = out[mask].to_dict('records')
+
     except Exception as e:
         print(f"  Error: {e}")
     
@@ -67,14 +60,13 @@ def main():
     corrected_stations = parse_gw_stations_correct()
     
     # Save corrected gw_stations.json
-    with open(OUTPUT_DIR / 'gw_stations.json', 'w') as f:
-        json.dump(corrected_stations, f)
+    (OUTPUT_DIR / 'gw_stations.json').write_bytes(
+        orjson.dumps(corrected_stations, option=orjson.OPT_SERIALIZE_NUMPY))
     print(f"Saved corrected gw_stations.json")
-    
+
     # Also update gw_stations_trends.json - preserve trend data but fix coords
     try:
-        with open(OUTPUT_DIR / 'gw_stations_trends.json', 'r') as f:
-            old_trends = json.load(f)
+        old_trends = orjson.loads((OUTPUT_DIR / 'gw_stations_trends.json').read_bytes())
         
         # Build lookup by station ID from old trends (to preserve trend data)
         trend_data = {}
@@ -96,8 +88,8 @@ def main():
                 s.update(trend_data[s['id']])
         
         # Save updated trends file
-        with open(OUTPUT_DIR / 'gw_stations_trends.json', 'w') as f:
-            json.dump(corrected_stations, f)
+        (OUTPUT_DIR / 'gw_stations_trends.json').write_bytes(
+            orjson.dumps(corrected_stations, option=orjson.OPT_SERIALIZE_NUMPY))
         print(f"Saved corrected gw_stations_trends.json")
         
     except Exception as e:
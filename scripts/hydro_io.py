@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Shared reader for eHYD (HZB) CSV exports.
+
+The analyze_* scripts all consume the same file layout: a small
+';'-separated station header, a 'Werte:' marker (daily files) or a first
+'01.MM.YYYY' row (monthly files), then 'date;value' rows. This module is
+the single place where the header scan, the pandas C-engine parse, the
+year extraction and the Parquet sidecar cache live, so optimizations
+apply to every script at once.
+"""
+
+import io
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from _parquet_cache import load_cached
+
+# Optional compiled parser for the daily value section (see setup_ext.py);
+# without it the pandas C engine does the same work a little slower
+try:
+    from _hzb_parse import parse_daily_values as _parse_daily_values_c
+except ImportError:
+    _parse_daily_values_c = None
+
+# Header lines worth keeping, mapped to canonical meta keys
+_HEADER_KEYS = {
+    'Messstelle:': 'name',
+    'HZB-Nummer:': 'hzb',
+}
+
+# BMN "Rechtswert - Hochwert" coordinate pair in the station header
+_COORD_RE = re.compile(r'([\d,]+)\s*-\s*([\d,]+)')
+
+# First data line ("01.MM.YYYY ...") marking the end of a monthly header
+_DATA_START_RE = re.compile(rb'^\s*01\.')
+
+
+def _parse_header_line(line, meta):
+    """Fill meta from a single header line."""
+    for prefix, key in _HEADER_KEYS.items():
+        if line.startswith(prefix):
+            meta[key] = line.split(';')[1].strip()
+            return
+    if ';' not in line:
+        return
+    if 'sser:' in line:  # Gewässer
+        parts = line.split(';')
+        if len(parts) > 1:
+            meta['river'] = parts[1].strip()
+    elif 'Einzugsgebiet' in line:
+        try:
+            val = line.split(';')[1].strip().replace(',', '.')
+            meta['catchment_km2'] = float(val)
+        except ValueError:
+            pass
+    elif 'Rechtswert' in line:
+        # BMN coordinates
+        match = _COORD_RE.search(line.split(';')[1].strip())
+        if match:
+            meta['x'] = float(match.group(1).replace(',', '.'))
+            meta['y'] = float(match.group(2).replace(',', '.'))
+
+
+def read_hzb_csv(filepath, positive_only=False):
+    """Read a daily eHYD CSV via the Parquet sidecar cache.
+
+    Returns (meta, df) where df has int16 'year' and float32 'val' columns
+    (only the year is ever used downstream). With positive_only, rows
+    with negative values are dropped (e.g. flow can't be negative). The
+    filter runs after the cache lookup - the sidecar always holds the
+    unfiltered rows, so both flag values share one cached parse per file.
+    """
+    meta, df = load_cached(filepath, _parse_daily_csv)
+    if positive_only and df is not None:
+        df = df[df['val'] >= 0]
+    return meta, df
+
+
+def _parse_daily_csv(filepath):
+    meta = {}
+    with open(filepath, 'rb') as f:
+        # The tiny header is streamed line-by-line; the rest of the file
+        # is the data section and is handed to the parser in one piece
+        body = None
+        for raw in f:
+            if raw.startswith(b'Werte:'):
+                body = f.read()
+                break
+            _parse_header_line(raw.decode('latin-1'), meta)
+        if body is None:
+            # No data section
+            return meta, None
+
+    if _parse_daily_values_c is not None:
+        # Compiled inner loop: one pass over the bytes, gap markers and
+        # malformed rows dropped as it goes
+        years, vals = _parse_daily_values_c(body)
+        df = pd.DataFrame({'year': years, 'val': vals})
+    else:
+        try:
+            df = pd.read_csv(
+                io.BytesIO(body), sep=';', header=None, usecols=[0, 1],
+                names=['date', 'val'], decimal=',', engine='c',
+                encoding='latin-1', na_values=['Lücke'], dtype={'date': str}
+            )
+        except pd.errors.EmptyDataError:
+            return meta, None
+
+        # Slice the year out of the fixed "DD.MM.YYYY HH:MM:SS" column
+        # instead of parsing full datetimes
+        df['year'] = pd.to_numeric(df['date'].str.slice(6, 10), errors='coerce')
+        df = df.dropna(subset=['year', 'val'])
+
+        # Narrow dtypes: mm/day, m³/s and daily loads are well within
+        # float32 precision, and years fit int16 - halves memory traffic
+        df = df[['year', 'val']].astype({'year': 'int16', 'val': 'float32'})
+
+    return meta, df
+
+
+def load_owf_meta(csv_path='data/owf/messstellen_owf.csv'):
+    """Load the OWF station metadata CSV as a DataFrame, Parquet-cached.
+
+    Numeric columns (river km, catchment area, BMN x/y) are converted up
+    front in bulk; consumers that want dicts call .to_dict('records').
+    """
+    _, df = load_cached(Path(csv_path), _parse_owf_meta)
+    return df
+
+
+def _parse_owf_meta(csv_path):
+    df = pd.read_csv(csv_path, sep=';', encoding='latin-1', dtype=str)
+    df = df.rename(columns={'hzbnr01': 'id', 'mstnam02': 'name',
+                            'gew03': 'river'})
+    for src, dst in (('mpua04', 'km'), ('egarea05', 'catchment_km2'),
+                     ('xrkko08', 'x'), ('yhkko09', 'y')):
+        df[dst] = pd.to_numeric(df[src].str.replace(',', '.', regex=False),
+                                errors='coerce')
+    return {}, df[['id', 'name', 'river', 'km', 'catchment_km2', 'x', 'y']]
+
+
+def read_hzb_monthly(filepath, min_rows=100):
+    """Read a monthly eHYD CSV via the Parquet sidecar cache.
+
+    Returns a DataFrame with a DatetimeIndex and a 'val' column, or None
+    when the file holds fewer than min_rows usable rows. The threshold is
+    applied after the cache lookup, so callers with different minimums
+    share one cached parse per file.
+    """
+    _, df = load_cached(filepath, _parse_monthly_csv)
+    if df is None or len(df) <= min_rows:
+        return None
+    return df
+
+
+def _parse_monthly_csv(filepath):
+    try:
+        # Find data start - first line starting with a date ("01.MM.YYYY")
+        skiprows = 0
+        with open(filepath, 'rb') as f:
+            for line in f:
+                if _DATA_START_RE.match(line):
+                    break
+                skiprows += 1
+            else:
+                return {}, None
+
+        df = pd.read_csv(
+            filepath, sep=';', skiprows=skiprows, header=None, usecols=[0, 1],
+            names=['date', 'val'], encoding='latin-1', engine='c',
+            na_values=['Lücke'], dtype=str
+        )
+
+        # Vectorised date + value conversion; bad rows become NaT/NaN
+        dates = pd.to_datetime(df['date'].str.slice(0, 10),
+                               format='%d.%m.%Y', errors='coerce')
+        values = pd.to_numeric(
+            df['val'].str.replace(',', '.', regex=False)
+                     .str.replace(r'[^0-9.\-]', '', regex=True),
+            errors='coerce')
+
+        df = pd.DataFrame({'val': values.to_numpy(dtype='float32')},
+                          index=pd.DatetimeIndex(dates))
+        df = df[df.index.notna() & df['val'].notna()]
+
+        if len(df):
+            return {}, df
+        return {}, None
+    except Exception:
+        return {}, None
@@ -6,188 +6,218 @@ Links flow data to:
 - Sediment (flow affects sediment transport capacity)
 """
 
-import json
-import math
+import heapq
+from collections import Counter
 from pathlib import Path
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return R * 2 * math.asin(math.sqrt(a))
+import numpy as np
+import orjson
+
+from _dist_cache import cached_pairwise
+from _geo import haversine
 
 def load_data():
-    muni = json.loads(Path('web/data/municipalities.json').read_text())
-    flow = json.loads(Path('data/flow_analysis.json').read_text())
-    plants = json.loads(Path('web/data/powerplants.json').read_text())
-    sediment = json.loads(Path('data/sediment_analysis.json').read_text())
-    
+    muni = orjson.loads(Path('web/data/municipalities.json').read_bytes())
+    flow = orjson.loads(Path('data/flow_analysis.json').read_bytes())
+    plants = orjson.loads(Path('web/data/powerplants.json').read_bytes())
+    sediment = orjson.loads(Path('data/sediment_analysis.json').read_bytes())
+
     # Filter flow stations with coordinates
     flow = [f for f in flow if f.get('lat') and f.get('lon')]
     return muni, flow, plants, sediment
 
-def find_nearby_flow(muni, flow_stations, max_dist_km=30):
+def find_nearby_flow(dists, trends, flows, rivers, max_dist_km=30):
     """Find flow stations near municipality.
-    
-    If no stations within max_dist_km, expand search to find nearest 3 stations.
+
+    If no stations within max_dist_km, expand search to find nearest 3
+    stations. Works on station columns (SoA): dists is this
+    municipality's row of the distance matrix, and trends/flows/rivers
+    are parallel per-station arrays.
     """
     # First try within standard radius
-    nearby = []
-    for f in flow_stations:
-        dist = haversine(muni['lat'], muni['lon'], f['lat'], f['lon'])
-        if dist <= max_dist_km:
-            nearby.append({**f, 'dist': dist})
-    
+    idx = np.nonzero(dists <= max_dist_km)[0]
+
     # If no nearby stations, find nearest 3 regardless of distance
     estimated = False
-    if not nearby:
-        all_with_dist = []
-        for f in flow_stations:
-            dist = haversine(muni['lat'], muni['lon'], f['lat'], f['lon'])
-            all_with_dist.append({**f, 'dist': dist})
-        all_with_dist.sort(key=lambda x: x['dist'])
-        nearby = all_with_dist[:3]  # Take nearest 3
+    if idx.size == 0 and dists.size:
+        k = min(3, dists.size)
+        idx = np.argpartition(dists, k - 1)[:k]  # Take nearest 3
         estimated = True
-    
-    if not nearby:
-        return None, None, 0, [], False
-    
+
+    if idx.size == 0:
+        return None, None, 0, np.empty(0, dtype=np.int32), False
+
     # Distance-weighted average trend
-    total_weight = 0
-    weighted_trend = 0
-    weighted_flow = 0
-    
-    for f in nearby:
-        weight = 1 / (1 + f['dist'])
-        weighted_trend += f['trend_pct_decade'] * weight
-        weighted_flow += f['mean_flow_m3s'] * weight
-        total_weight += weight
-    
-    if total_weight > 0:
-        avg_trend = weighted_trend / total_weight
-        avg_flow = weighted_flow / total_weight
-        # Get rivers
-        rivers = list(set(f['river'] for f in nearby if f.get('river')))
-        return avg_trend, avg_flow, len(nearby), rivers[:4], estimated
-    
-    return None, None, 0, [], False
+    weights = 1 / (1 + dists[idx])
+    total_weight = weights.sum()
+    avg_trend = float((trends[idx] * weights).sum() / total_weight)
+    avg_flow = float((flows[idx] * weights).sum() / total_weight)
+
+    # Get rivers (as interned integer ids; 0 = unnamed): insertion-ordered
+    # dedup that stops at 4 uniques, instead of np.unique-then-slice
+    seen = {}
+    for rid in rivers[idx].tolist():
+        if rid and rid not in seen:
+            seen[rid] = None
+            if len(seen) == 4:
+                break
+    nearby = np.fromiter(seen, dtype=np.int32, count=len(seen))
+    return avg_trend, avg_flow, int(idx.size), nearby, estimated
+
+def intern_rivers(records, river_to_id):
+    """Map each record's river name to a small int, interning new names.
+
+    Hot-path membership tests then compare machine ints (np.isin)
+    instead of hashing ~40-byte unicode objects; id 0 is 'no river'.
+    """
+    return np.array([river_to_id.setdefault(r.get('river') or '', len(river_to_id))
+                     for r in records], dtype=np.int32)
+
+def plant_columns(plants, river_to_id):
+    """Precompute plant columns (SoA) with the shared river encoding."""
+    lat = np.array([p['lat'] for p in plants], dtype=np.float32)
+    lon = np.array([p['lon'] for p in plants], dtype=np.float32)
+    mw = np.array([p.get('mw', 0) or 0 for p in plants], dtype=np.float64)
+    river_id = intern_rivers(plants, river_to_id)
+    return lat, lon, mw, river_id
 
-def check_hydro_influence(muni, plants, flow_rivers, max_dist_km=50):
+def check_hydro_influence(muni, plant_cols, flow_rids, max_dist_km=50):
     """Check if nearby hydropower affects flow on these rivers."""
-    influenced_mw = 0
-    for p in plants:
-        dist = haversine(muni['lat'], muni['lon'], p['lat'], p['lon'])
-        if dist <= max_dist_km and p.get('river') in flow_rivers:
-            influenced_mw += p.get('mw', 0) or 0
-    return influenced_mw
-
-def check_sediment_correlation(flow_rivers, sediment_data):
+    plat, plon, pmw, priver_id = plant_cols
+    dists = haversine(muni['lat'], muni['lon'], plat, plon)
+    mask = (dists <= max_dist_km) & np.isin(priver_id, flow_rids)
+    return float(pmw[mask].sum())
+
+def sediment_by_river(sediment_data, river_to_id):
+    """Group sediment trends per river id once, as small NumPy arrays."""
+    rids = intern_rivers(sediment_data, river_to_id)
+    grouped = {}
+    for rid, s in zip(rids, sediment_data):
+        grouped.setdefault(int(rid), []).append(s['trend_pct'])
+    return {rid: np.array(trends) for rid, trends in grouped.items()}
+
+def check_sediment_correlation(flow_rids, sed_by_river):
     """Check sediment trends on same rivers."""
-    matching = [s for s in sediment_data if s.get('river') in flow_rivers]
+    matching = [sed_by_river[rid] for rid in flow_rids.tolist() if rid in sed_by_river]
     if matching:
-        avg_sed_trend = sum(s['trend_pct'] for s in matching) / len(matching)
-        return avg_sed_trend, len(matching)
+        trends = np.concatenate(matching)
+        return float(trends.mean()), len(trends)
     return None, 0
 
 def calculate_flow_risk(trend_pct):
-    """Convert flow trend to risk factor.
-    
+    """Convert flow trends to risk factors (0-1), vectorised.
+
     Only declining flow = risk. Stable or increasing = no risk.
-    Scale: -20% per decade = 100% risk, 0 or positive = 0% risk
+    Scale: -20% per decade = 100% risk, 0 or positive = 0% risk.
+    NaN (no trend data) stays NaN.
     """
-    if trend_pct is None:
-        return None
-    
-    # Only negative trends contribute to risk
-    if trend_pct >= 0:
-        return 0.0
-    
-    # Scale: -20%/dec = 100% risk, 0 = 0% risk
-    risk = min(1.0, abs(trend_pct) / 20)
-    return round(risk, 3)
+    return np.where(trend_pct >= 0, 0.0, np.minimum(1.0, np.abs(trend_pct) / 20))
+
+def recalculate_risk_scores(results, flow_risk):
+    """Recalculate composite risk with flow, over all municipalities at once.
 
-def recalculate_risk_score(muni):
-    """Recalculate composite risk with flow.
-    
     New weights:
     - Groundwater: 35%
     - Hydropower: 25%
     - Precipitation: 25%
     - Surface water flow: 15%
     """
-    gw_risk = muni.get('gw_risk', 0) or 0
-    hydro_factor = muni.get('hydro_factor', 0) or 0
-    precip_risk = muni.get('precip_risk', 0.5) or 0.5
-    flow_risk = muni.get('flow_risk', 0.5) or 0.5
-    
-    risk_score = (gw_risk * 0.35) + (hydro_factor * 0.25) + (precip_risk * 0.25) + (flow_risk * 0.15)
-    
-    if risk_score >= 0.6:
-        category = 'high'
-    elif risk_score >= 0.4:
-        category = 'medium'
-    else:
-        category = 'low'
-    
-    return round(risk_score, 3), category
+    gw = np.array([m.get('gw_risk', 0) or 0 for m in results])
+    hydro = np.array([m.get('hydro_factor', 0) or 0 for m in results])
+    precip = np.array([m.get('precip_risk', 0.5) or 0.5 for m in results])
+    # Default to neutral - like the old `or 0.5`, a computed risk of 0.0
+    # (stable/increasing trend) counts as neutral too, not as no risk
+    flow = np.where(np.isnan(flow_risk) | (flow_risk == 0.0), 0.5, flow_risk)
+
+    risk = np.round(0.35 * gw + 0.25 * hydro + 0.25 * precip + 0.15 * flow, 3)
+    category = np.select([risk >= 0.6, risk >= 0.4], ['high', 'medium'], default='low')
+    return risk, category
 
 def main():
     muni, flow, plants, sediment = load_data()
     print(f"Loaded {len(muni)} municipalities, {len(flow)} flow stations")
-    
+
+    # Station columns (SoA), built once: coordinate, trend and flow
+    # arrays plus a parallel river-name list
+    # float32 coordinates: ~1 m haversine error at these scales, against
+    # 30-50 km decision radii - halves the distance matrix's footprint
+    flow_lat = np.array([f['lat'] for f in flow], dtype=np.float32)
+    flow_lon = np.array([f['lon'] for f in flow], dtype=np.float32)
+    flow_trend = np.array([f['trend_pct_decade'] for f in flow], dtype=np.float64)
+    flow_mean = np.array([f['mean_flow_m3s'] for f in flow], dtype=np.float64)
+    # Shared river-name interning table across all three datasets
+    river_to_id = {'': 0}
+    flow_river = intern_rivers(flow, river_to_id)
+    muni_lat = np.array([m['lat'] for m in muni], dtype=np.float32)
+    muni_lon = np.array([m['lon'] for m in muni], dtype=np.float32)
+
+    # All municipality x station distances, cached to disk across runs
+    dist_matrix = cached_pairwise(muni_lat, muni_lon, flow_lat, flow_lon, 'flow')
+    plant_cols = plant_columns(plants, river_to_id)
+    sed_by_river = sediment_by_river(sediment, river_to_id)
+    id_to_river = {rid: name for name, rid in river_to_id.items()}
+
     results = []
-    with_flow = 0
+    trends = np.full(len(muni), np.nan)
     hydro_influenced = 0
-    
-    for m in muni:
-        trend, mean_flow, station_count, rivers, estimated = find_nearby_flow(m, flow)
-        flow_risk = calculate_flow_risk(trend)
-        
+
+    for i, (m, dists) in enumerate(zip(muni, dist_matrix)):
+        trend, mean_flow, station_count, rivers, estimated = find_nearby_flow(
+            dists, flow_trend, flow_mean, flow_river)
+        if trend is not None:
+            trends[i] = trend
+
         # Check hydropower influence on these rivers
-        hydro_mw = check_hydro_influence(m, plants, rivers) if rivers else 0
-        
+        hydro_mw = check_hydro_influence(m, plant_cols, rivers) if rivers.size else 0
+
         # Check sediment correlation
-        sed_trend, sed_count = check_sediment_correlation(rivers, sediment) if rivers else (None, 0)
-        
+        sed_trend, sed_count = check_sediment_correlation(rivers, sed_by_river) if rivers.size else (None, 0)
+
         # Update municipality data
         m['flow_trend_pct'] = round(trend, 1) if trend else None
         m['flow_mean_m3s'] = round(mean_flow, 1) if mean_flow else None
         m['flow_stations'] = station_count
-        m['flow_rivers'] = rivers if rivers else []
+        m['flow_rivers'] = [id_to_river[rid] for rid in rivers.tolist()]
         m['flow_estimated'] = estimated
-        m['flow_risk'] = flow_risk
         m['flow_hydro_mw'] = hydro_mw  # MW of hydro on same rivers
         m['flow_sediment_trend'] = round(sed_trend, 1) if sed_trend else None
-        
-        if flow_risk is not None:
-            with_flow += 1
+
         if hydro_mw > 0:
             hydro_influenced += 1
-        
-        # Recalculate composite risk
-        m['risk_score'], m['risk_category'] = recalculate_risk_score(m)
+
         results.append(m)
-    
-    results.sort(key=lambda x: x['risk_score'], reverse=True)
-    
+
+    # Risk conversion and composite score over all municipalities in one
+    # array pass instead of scalar math inside the loop
+    flow_risk = calculate_flow_risk(trends)
+    risk_score, risk_category = recalculate_risk_scores(results, flow_risk)
+    with_flow = int(np.count_nonzero(~np.isnan(flow_risk)))
+    for m, fr, rs, cat in zip(results, flow_risk, risk_score, risk_category):
+        m['flow_risk'] = round(float(fr), 3) if not np.isnan(fr) else None
+        m['risk_score'] = float(rs)
+        m['risk_category'] = str(cat)
+
     print(f"\nFlow data added to {with_flow}/{len(muni)} municipalities")
     print(f"Hydropower-influenced flow: {hydro_influenced} municipalities")
-    
+
+    # Only the top 15 are shown - a bounded heap selection beats sorting
+    # the whole list, and the JSON output doesn't need a fixed order
+    top15 = heapq.nlargest(15, results, key=lambda x: x['risk_score'])
+
     print(f"\nTop 15 by new risk score:")
     print(f"{'Municipality':<20} {'Risk':>6} {'GW':>5} {'Hyd':>5} {'Prc':>5} {'Flow':>5} {'FlwTr':>8}")
     print("-" * 62)
-    for m in results[:15]:
+    for m in top15:
         ft = f"{m['flow_trend_pct']:+.0f}%" if m['flow_trend_pct'] else 'N/A'
         print(f"{m['name'][:19]:<20} {m['risk_score']*100:>5.1f}% {m.get('gw_risk',0)*100:>4.0f}% {m.get('hydro_factor',0)*100:>4.0f}% {(m.get('precip_risk',0) or 0)*100:>4.0f}% {(m.get('flow_risk',0) or 0)*100:>4.0f}% {ft:>8}")
     
-    # Risk categories
-    high = len([m for m in results if m['risk_category'] == 'high'])
-    med = len([m for m in results if m['risk_category'] == 'medium'])
-    print(f"\nRisk categories: {high} high, {med} medium, {len(results)-high-med} low")
+    # Risk categories - one pass instead of a scan per category
+    cats = Counter(m['risk_category'] for m in results)
+    print(f"\nRisk categories: {cats['high']} high, {cats['medium']} medium, {cats['low']} low")
     
-    # Save
-    Path('web/data/municipalities.json').write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    # Save - compact output; pretty-printing roughly doubles the bytes
+    Path('web/data/municipalities.json').write_bytes(
+        orjson.dumps(results, option=orjson.OPT_SERIALIZE_NUMPY))
     print(f"\nUpdated web/data/municipalities.json")
 
 if __name__ == '__main__':
@@ -1,158 +1,144 @@
 #!/usr/bin/env python3
 """Integrate precipitation data into municipality risk scores."""
 
-import json
-import math
+import heapq
+from collections import Counter
 from pathlib import Path
 
-def haversine(lat1, lon1, lat2, lon2):
-    """Distance in km."""
-    R = 6371
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    return R * 2 * math.asin(math.sqrt(a))
+import numpy as np
+import orjson
+
+from _dist_cache import cached_pairwise
 
 def load_data():
-    muni = json.loads(Path('web/data/municipalities.json').read_text())
-    precip = json.loads(Path('data/precipitation_analysis.json').read_text())
+    muni = orjson.loads(Path('web/data/municipalities.json').read_bytes())
+    precip = orjson.loads(Path('data/precipitation_analysis.json').read_bytes())
     # Filter stations with coordinates
     precip = [p for p in precip if p.get('lat') and p.get('lon')]
     return muni, precip
 
-def find_nearby_precip(muni, precip_stations, max_dist_km=30):
+def find_nearby_precip(dists, trends, means, max_dist_km=30):
     """Find precipitation stations near municipality and calculate weighted average.
-    
-    If no stations within max_dist_km, expand search to find nearest 3 stations.
+
+    If no stations within max_dist_km, expand search to find nearest 3
+    stations. Works on station columns (SoA): dists is this
+    municipality's row of the distance matrix, and trends/means are
+    parallel per-station arrays.
     """
     # First try within standard radius
-    nearby = []
-    for p in precip_stations:
-        dist = haversine(muni['lat'], muni['lon'], p['lat'], p['lon'])
-        if dist <= max_dist_km:
-            nearby.append({**p, 'dist': dist})
-    
+    idx = np.nonzero(dists <= max_dist_km)[0]
+
     # If no nearby stations, find nearest 3 regardless of distance
     estimated = False
-    if not nearby:
-        all_with_dist = []
-        for p in precip_stations:
-            dist = haversine(muni['lat'], muni['lon'], p['lat'], p['lon'])
-            all_with_dist.append({**p, 'dist': dist})
-        all_with_dist.sort(key=lambda x: x['dist'])
-        nearby = all_with_dist[:3]  # Take nearest 3
+    if idx.size == 0 and dists.size:
+        k = min(3, dists.size)
+        idx = np.argpartition(dists, k - 1)[:k]  # Take nearest 3
         estimated = True
-    
-    if not nearby:
+
+    if idx.size == 0:
         return None, None, 0, False
-    
-    # Distance-weighted average trend
-    total_weight = 0
-    weighted_trend = 0
-    weighted_mean = 0
-    
-    for p in nearby:
-        weight = 1 / (1 + p['dist'])  # Inverse distance weighting
-        weighted_trend += p['trend_mm_decade'] * weight
-        weighted_mean += p['mean_annual_mm'] * weight
-        total_weight += weight
-    
-    if total_weight > 0:
-        avg_trend = weighted_trend / total_weight
-        avg_mean = weighted_mean / total_weight
-        return avg_trend, avg_mean, len(nearby), estimated
-    
-    return None, None, 0, False
 
-def calculate_precip_risk(trend_mm, mean_mm):
-    """Convert precipitation trend to risk factor (0-1).
-    
+    # Distance-weighted average trend (inverse distance weighting)
+    weights = 1 / (1 + dists[idx])
+    total_weight = weights.sum()
+    avg_trend = float((trends[idx] * weights).sum() / total_weight)
+    avg_mean = float((means[idx] * weights).sum() / total_weight)
+    return avg_trend, avg_mean, int(idx.size), estimated
+
+def calculate_precip_risk(trend_mm):
+    """Convert precipitation trends to risk factors (0-1), vectorised.
+
     Only declining precipitation = risk. Stable or increasing = no risk.
-    Scale: -100 mm/decade = 1.0 risk, 0 or positive = 0.0 risk
+    Scale: -100 mm/decade = 1.0 risk, 0 or positive = 0.0 risk.
+    NaN (no trend data) stays NaN.
     """
-    if trend_mm is None:
-        return None
-    
-    # Only negative trends contribute to risk
-    # -100mm/dec -> 1.0, 0 or positive -> 0.0
-    if trend_mm >= 0:
-        return 0.0
-    
-    # Scale: -100mm/dec = 100% risk, 0 = 0% risk
-    risk = min(1.0, abs(trend_mm) / 100)
-    return round(risk, 3)
+    return np.where(trend_mm >= 0, 0.0, np.minimum(1.0, np.abs(trend_mm) / 100))
+
+def recalculate_risk_scores(results, precip_risk):
+    """Recalculate composite risk with precipitation, over all municipalities at once.
 
-def recalculate_risk_score(muni):
-    """Recalculate composite risk score with precipitation.
-    
     New weights:
     - Groundwater trend: 40%
     - Hydropower impact: 30%
     - Precipitation trend: 30%
     """
-    gw_risk = muni.get('gw_risk', 0) or 0
-    hydro_factor = muni.get('hydro_factor', 0) or 0
-    precip_risk = muni.get('precip_risk', 0.5) or 0.5  # Default to neutral
-    
-    # Weighted combination
-    risk_score = (gw_risk * 0.4) + (hydro_factor * 0.3) + (precip_risk * 0.3)
-    
-    # Categorize
-    if risk_score >= 0.6:
-        category = 'high'
-    elif risk_score >= 0.4:
-        category = 'medium'
-    else:
-        category = 'low'
-    
-    return round(risk_score, 3), category
+    gw = np.array([m.get('gw_risk', 0) or 0 for m in results])
+    hydro = np.array([m.get('hydro_factor', 0) or 0 for m in results])
+    # Default to neutral - like the old `or 0.5`, a computed risk of 0.0
+    # (stable/increasing trend) counts as neutral too, not as no risk
+    precip = np.where(np.isnan(precip_risk) | (precip_risk == 0.0),
+                      0.5, precip_risk)
+
+    # Weighted combination, then categorize
+    risk = np.round(0.4 * gw + 0.3 * hydro + 0.3 * precip, 3)
+    category = np.select([risk >= 0.6, risk >= 0.4], ['high', 'medium'], default='low')
+    return risk, category
 
 def main():
     muni, precip = load_data()
     print(f"Loaded {len(muni)} municipalities, {len(precip)} precip stations with coords")
-    
+
+    # Station columns (SoA), built once: coordinate, trend and mean
+    # precipitation arrays indexed by station
+    # float32 coordinates: ~1 m haversine error at these scales, against
+    # a 30 km decision radius - halves the distance matrix's footprint
+    precip_lat = np.array([p['lat'] for p in precip], dtype=np.float32)
+    precip_lon = np.array([p['lon'] for p in precip], dtype=np.float32)
+    precip_trend = np.array([p['trend_mm_decade'] for p in precip], dtype=np.float64)
+    precip_mean = np.array([p['mean_annual_mm'] for p in precip], dtype=np.float64)
+    muni_lat = np.array([m['lat'] for m in muni], dtype=np.float32)
+    muni_lon = np.array([m['lon'] for m in muni], dtype=np.float32)
+
+    # All municipality x station distances, cached to disk across runs
+    dist_matrix = cached_pairwise(muni_lat, muni_lon, precip_lat, precip_lon, 'precip')
+
     results = []
-    with_precip = 0
-    
-    for m in muni:
-        trend, mean_precip, station_count, estimated = find_nearby_precip(m, precip)
-        precip_risk = calculate_precip_risk(trend, mean_precip)
-        
+    trends = np.full(len(muni), np.nan)
+
+    for i, (m, dists) in enumerate(zip(muni, dist_matrix)):
+        trend, mean_precip, station_count, estimated = find_nearby_precip(
+            dists, precip_trend, precip_mean)
+        if trend is not None:
+            trends[i] = trend
+
         # Update municipality data
         m['precip_trend_mm'] = round(trend, 1) if trend else None
         m['precip_mean_mm'] = round(mean_precip, 0) if mean_precip else None
         m['precip_stations'] = station_count
         m['precip_estimated'] = estimated
-        m['precip_risk'] = precip_risk
-        
-        if precip_risk is not None:
-            with_precip += 1
-        
-        # Recalculate composite risk
-        m['risk_score'], m['risk_category'] = recalculate_risk_score(m)
-        
+
         results.append(m)
-    
-    # Sort by new risk score
-    results.sort(key=lambda x: x['risk_score'], reverse=True)
-    
+
+    # Risk conversion and composite score over all municipalities in one
+    # array pass instead of scalar math inside the loop
+    precip_risk = calculate_precip_risk(trends)
+    risk_score, risk_category = recalculate_risk_scores(results, precip_risk)
+    with_precip = int(np.count_nonzero(~np.isnan(precip_risk)))
+    for m, pr, rs, cat in zip(results, precip_risk, risk_score, risk_category):
+        m['precip_risk'] = round(float(pr), 3) if not np.isnan(pr) else None
+        m['risk_score'] = float(rs)
+        m['risk_category'] = str(cat)
+
     print(f"\nPrecipitation data added to {with_precip}/{len(muni)} municipalities")
-    
+
+    # Only the top 15 are shown - a bounded heap selection beats sorting
+    # the whole list, and the JSON output doesn't need a fixed order
+    top15 = heapq.nlargest(15, results, key=lambda x: x['risk_score'])
+
     print(f"\nTop 15 by new risk score:")
     print(f"{'Municipality':<22} {'Risk':>6} {'GW':>6} {'Hydro':>6} {'Precip':>6} {'P.Trend':>10}")
     print("-" * 65)
-    for m in results[:15]:
+    for m in top15:
         pt = f"{m['precip_trend_mm']:+.0f}mm" if m['precip_trend_mm'] else 'N/A'
         print(f"{m['name'][:21]:<22} {m['risk_score']*100:>5.1f}% {m.get('gw_risk',0)*100:>5.1f}% {m.get('hydro_factor',0)*100:>5.1f}% {(m.get('precip_risk',0) or 0)*100:>5.1f}% {pt:>10}")
     
-    # Count risk categories
-    high = len([m for m in results if m['risk_category'] == 'high'])
-    med = len([m for m in results if m['risk_category'] == 'medium'])
-    low = len([m for m in results if m['risk_category'] == 'low'])
-    print(f"\nRisk categories: {high} high, {med} medium, {low} low")
+    # Count risk categories - one pass instead of a scan per category
+    cats = Counter(m['risk_category'] for m in results)
+    print(f"\nRisk categories: {cats['high']} high, {cats['medium']} medium, {cats['low']} low")
     
-    # Save
-    Path('web/data/municipalities.json').write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    # Save - compact output; pretty-printing roughly doubles the bytes
+    Path('web/data/municipalities.json').write_bytes(
+        orjson.dumps(results, option=orjson.OPT_SERIALIZE_NUMPY))
     print(f"\nUpdated web/data/municipalities.json")
 
 if __name__ == '__main__':
@@ -3,28 +3,27 @@
 
 import json
 from pathlib import Path
-from collections import defaultdict
+
+import pandas as pd
 
 def load_powerplants():
     return json.loads(Path('web/data/powerplants.json').read_text())
 
-def aggregate_by_river():
-    """Group power plants by river and calculate stats."""
-    plants = load_powerplants()
-    rivers = defaultdict(lambda: {'total_mw': 0, 'plants': [], 'types': defaultdict(float)})
-    
-    for p in plants:
-        river = p.get('river', '-')
-        if river == '-' or not river:
-            river = 'Unknown'
-        mw = p.get('mw', 0) or 0
-        ptype = p.get('type', 'Unknown')
-        
-        rivers[river]['total_mw'] += mw
-        rivers[river]['plants'].append(p)
-        rivers[river]['types'][ptype] += mw
-    
-    return dict(rivers)
+def aggregate_by_river(plants):
+    """Group power plants by river, as a (river x type) MW table.
+
+    One pivot_table/groupby pass replaces the per-plant Python
+    accumulation into nested defaultdicts.
+    """
+    df = pd.DataFrame(plants)
+    df['river'] = df['river'].replace({'-': None, '': None}).fillna('Unknown')
+    df['mw'] = pd.to_numeric(df['mw'], errors='coerce').fillna(0)
+    df['type'] = df['type'].fillna('Unknown')
+
+    pivot = df.pivot_table(index='river', columns='type', values='mw',
+                           aggfunc='sum', fill_value=0.0)
+    counts = df.groupby('river').size()
+    return pivot, counts
 
 def calculate_impact_factors():
     """Calculate impact factors for each plant type."""
@@ -36,25 +35,27 @@ def calculate_impact_factors():
     }
 
 def main():
-    rivers = aggregate_by_river()
+    plants = load_powerplants()
+    pivot, counts = aggregate_by_river(plants)
     impacts = calculate_impact_factors()
-    
-    # Calculate weighted impact per river
-    river_impacts = []
-    for river, data in rivers.items():
-        weighted_impact = 0
-        for ptype, mw in data['types'].items():
-            impact = impacts.get(ptype, 0.4)  # default moderate
-            weighted_impact += mw * impact
-        
-        river_impacts.append({
+
+    # Weighted impact per river as one matrix product: the (river x type)
+    # MW table times the per-type impact vector (default moderate = 0.4)
+    impact_vec = pivot.columns.map(lambda t: impacts.get(t, 0.4)).to_numpy()
+    weighted = pivot.to_numpy() @ impact_vec
+    total = pivot.sum(axis=1).to_numpy()
+
+    river_impacts = [
+        {
             'river': river,
-            'total_mw': data['total_mw'],
-            'weighted_impact': weighted_impact,
-            'plant_count': len(data['plants']),
-            'types': dict(data['types'])
-        })
-    
+            'total_mw': float(t),
+            'weighted_impact': float(w),
+            'plant_count': int(counts[river]),
+            'types': {ptype: float(mw) for ptype, mw in row.items() if mw > 0},
+        }
+        for (river, row), t, w in zip(pivot.iterrows(), total, weighted)
+    ]
+
     # Sort by total MW
     river_impacts.sort(key=lambda x: x['total_mw'], reverse=True)
     
@@ -14,6 +14,8 @@ import os
 import json
 import re
 import glob
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import warnings
@@ -22,57 +24,63 @@ warnings.filterwarnings('ignore')
 import pandas as pd
 import numpy as np
 import geopandas as gpd
+from pyproj import Transformer
 from shapely.geometry import Point
-from scipy import stats
+
+from _trend_numba import mk_sen
+from hydro_io import read_hzb_csv
+
+# MGI Austria Lambert -> WGS84, built once and applied to whole arrays
+_T_BMN = Transformer.from_crs('EPSG:31287', 'EPSG:4326', always_xy=True)
 
 DATA_DIR = Path('../data')
 OUTPUT_DIR = Path('../web/data')
 
+# Station-header coordinate patterns, compiled once instead of per call
+_LAT_RE = re.compile(r'Breite.*?(\d{2})\s+(\d{2})\s+(\d{2})')
+_LON_RE = re.compile(r'Länge.*?(\d{2})\s+(\d{2})\s+(\d{2})')
+_BMN_RE = re.compile(r'(\d+),00\s+-\s+(\d+),00')
+
 def parse_ehyd_csv(filepath, value_col=1):
     """
     Parse eHYD CSV file format.
     Returns DataFrame with date index and values.
     """
     try:
-        with open(filepath, 'r', encoding='latin-1') as f:
-            lines = f.readlines()
-        
-        # Find the data start (after "Werte:" line)
+        # Find the data start (after "Werte:" line) by streaming only the
+        # short station header
         data_start = 0
-        for i, line in enumerate(lines):
-            if 'Werte:' in line or line.strip().startswith('01.'):
-                data_start = i + 1 if 'Werte:' in line else i
-                break
-        
-        # Parse data lines
-        dates = []
-        values = []
-        
-        for line in lines[data_start:]:
-            line = line.strip()
-            if not line or 'Lücke' in line:
-                continue
-            
-            parts = line.split(';')
-            if len(parts) >= 2:
-                try:
-                    # Parse date (format: DD.MM.YYYY HH:MM:SS)
-                    date_str = parts[0].strip()
-                    date_match = re.match(r'(\d{2}\.\d{2}\.\d{4})', date_str)
-                    if date_match:
-                        date = pd.to_datetime(date_match.group(1), format='%d.%m.%Y')
-                        
-                        # Parse value
-                        val_str = parts[value_col].strip().replace(',', '.')
-                        if val_str and not any(x in val_str for x in ['Lücke', '-']):
-                            val = float(val_str)
-                            dates.append(date)
-                            values.append(val)
-                except (ValueError, IndexError):
-                    continue
-        
-        if dates:
-            return pd.DataFrame({'value': values}, index=pd.DatetimeIndex(dates))
+        with open(filepath, 'r', encoding='latin-1') as f:
+            for i, line in enumerate(f):
+                if 'Werte:' in line:
+                    data_start = i + 1
+                    break
+                if line.strip().startswith('01.'):
+                    data_start = i
+                    break
+
+        # The pandas C engine tokenizes the whole data section at once;
+        # the per-line regex match and float() conversion go away
+        df = pd.read_csv(
+            filepath, sep=';', skiprows=data_start, header=None,
+            usecols=[0, value_col], names=['date', 'value'],
+            encoding='latin-1', engine='c', na_values=['Lücke'],
+            dtype=str, on_bad_lines='skip'
+        )
+
+        # Vectorised date + value conversion; bad rows become NaT/NaN
+        dates = pd.to_datetime(df['date'].str.slice(0, 10),
+                               format='%d.%m.%Y', errors='coerce')
+        values = pd.to_numeric(
+            df['value'].str.replace(',', '.', regex=False),
+            errors='coerce')
+
+        df = pd.DataFrame({'value': values.to_numpy()},
+                          index=pd.DatetimeIndex(dates))
+        df = df[df.index.notna() & df['value'].notna()]
+
+        if len(df):
+            return df
         return None
     except Exception as e:
         return None
@@ -82,12 +90,15 @@ def get_station_coords(metadata_file):
     Extract coordinates from station metadata file.
     """
     try:
-        with open(metadata_file, 'r', encoding='latin-1') as f:
-            content = f.read()
-        
+        # The coordinate block sits in the first couple of KB of the
+        # station header - reading 4 KB bounds both the I/O and the
+        # regex scans on files that carry years of data below it
+        with open(metadata_file, 'rb') as f:
+            content = f.read(4096).decode('latin-1', errors='replace')
+
         # Look for geographic coordinates (Bessel)
-        lat_match = re.search(r'Breite.*?(\d{2})\s+(\d{2})\s+(\d{2})', content)
-        lon_match = re.search(r'Länge.*?(\d{2})\s+(\d{2})\s+(\d{2})', content)
+        lat_match = _LAT_RE.search(content)
+        lon_match = _LON_RE.search(content)
         
         if lat_match and lon_match:
             lat = float(lat_match.group(1)) + float(lat_match.group(2))/60 + float(lat_match.group(3))/3600
@@ -95,7 +106,7 @@ def get_station_coords(metadata_file):
             return lon, lat
         
         # Try BMN coordinates
-        bmn_match = re.search(r'(\d+),00\s+-\s+(\d+),00', content)
+        bmn_match = _BMN_RE.search(content)
         if bmn_match:
             # BMN M34 to WGS84 rough conversion
             y = float(bmn_match.group(1))
@@ -128,94 +139,166 @@ def calculate_trend(series, min_years=20):
         return None, None
     
     try:
-        # Resample to yearly means
-        yearly = series.resample('Y').mean().dropna()
+        # NaN rows (e.g. months the resample('M') upstream filled for
+        # gaps) would poison their year's bincount sum, where the old
+        # resample('Y').mean() skipped them - drop them up front
+        series = series.dropna()
+        if len(series) < min_years:
+            return None, None
+
+        # Yearly means via bincount - one C pass over the values instead
+        # of the resample('Y') offset/groupby machinery per station
+        years = series.index.year.to_numpy()
+        idx = years - years.min()
+        counts = np.bincount(idx)
+        sums = np.bincount(idx, weights=series.to_numpy(dtype=np.float64))
+        yearly = sums[counts > 0] / counts[counts > 0]
         if len(yearly) < min_years:
             return None, None
-        
-        x = np.arange(len(yearly))
-        y = yearly.values
-        
-        # Sen's slope estimator
-        slope, intercept, _, _, _ = stats.linregress(x, y)
-        
+
+        # Compiled kernel: Sen's slope and the Mann-Kendall p-value in one
+        # pair sweep, instead of scipy linregress + kendalltau per station
+        slope, p_value = mk_sen(yearly)
+
         # Trend per decade
         trend_per_decade = slope * 10
-        
-        # Calculate significance
-        _, p_value = stats.kendalltau(x, y)
-        
+
         return trend_per_decade, p_value
     except:
         return None, None
 
+def _first_col(df, names):
+    """Return the first of the named columns that exists, else None."""
+    for n in names:
+        if n in df.columns:
+            return df[n]
+    return None
+
+def _station_records(station_list, x_cols, y_cols, extra=None):
+    """Convert a station list to [{'station_id', lon, lat, ...}] records.
+
+    The rough BMN->WGS84 conversion and the Austrian bounding-box filter
+    run as whole-column operations instead of per-row iterrows work;
+    records are materialised only at the end. Returns [] when the
+    expected id/coordinate columns are missing.
+    """
+    if station_list is None:
+        return []
+    ids = _first_col(station_list, ('hzbnr01', 'dbmsnr'))
+    x = _first_col(station_list, x_cols)
+    y = _first_col(station_list, y_cols)
+    if ids is None or x is None or y is None:
+        return []
+
+    x = pd.to_numeric(x.astype(str).str.replace(',', '.', regex=False),
+                      errors='coerce')
+    y = pd.to_numeric(y.astype(str).str.replace(',', '.', regex=False),
+                      errors='coerce')
+
+    # Proper BMN -> WGS84 through PROJ in one array call (same transform
+    # as fix_coordinates.py); the bounding box below stays as a sanity
+    # filter instead of papering over approximation error
+    lon, lat = _T_BMN.transform(x.to_numpy(), y.to_numpy())
+    lon = pd.Series(lon, index=station_list.index)
+    lat = pd.Series(lat, index=station_list.index)
+
+    out = pd.DataFrame({'station_id': ids.astype(str)})
+    for dst, src in (extra or {}).items():
+        out[dst] = (station_list[src].fillna('').astype(str)
+                    if src in station_list.columns else '')
+    out['lon'] = lon
+    out['lat'] = lat
+
+    mask = lon.gt(9) & lon.lt(18) & lat.gt(46) & lat.lt(49)
+    return out[mask].to_dict('records')
+
+def _process_one_gw(csv_file):
+    """Parse and trend one groundwater file (runs in a worker process)."""
+    series = parse_ehyd_csv(csv_file)
+    if series is None or len(series) <= 100:
+        return None
+    values = series['value']
+    trend, p_value = calculate_trend(values)
+    return (csv_file.stem.split('-')[-1], trend, p_value,
+            values.mean(), values.std(), len(series) / 12,
+            values[-60:].mean() if len(series) >= 60 else None,
+            values[:60].mean() if len(series) >= 60 else None)
+
+def _process_one_sw(csv_file):
+    """Parse and trend one discharge file (runs in a worker process)."""
+    series = parse_ehyd_csv(csv_file)
+    if series is None or len(series) <= 365 * 10:
+        return None
+    # Resample to monthly
+    monthly = series.resample('M').mean()
+    trend, p_value = calculate_trend(monthly['value'])
+    return (csv_file.stem.split('-')[-1], trend, p_value,
+            series['value'].mean(), len(series) / 365)
+
+def _process_one_precip(csv_file):
+    """Parse and trend one precipitation file (runs in a worker process)."""
+    # Shared daily reader: compiled _hzb_parse inner loop where built,
+    # Parquet sidecar cache either way - only the year is needed for
+    # yearly totals, so the full datetime parse is skipped
+    _, df = read_hzb_csv(csv_file)
+    if df is None or len(df) <= 365 * 10:
+        return None
+    # Yearly totals via bincount on the year column
+    years = df['year'].to_numpy(dtype=np.int64)
+    idx = years - years.min()
+    counts = np.bincount(idx)
+    sums = np.bincount(idx, weights=df['val'].to_numpy(dtype=np.float64))
+    totals = sums[counts > 0]
+    yearly = pd.Series(totals,
+                       index=pd.to_datetime(np.unique(years), format='%Y'))
+    trend, p_value = calculate_trend(yearly)
+    return (csv_file.stem.split('-')[-1], trend, p_value, totals.mean())
+
+def _process_ehyd_stations(list_csv, ts_dir, worker, result_keys,
+                           x_cols=('x',), y_cols=('y',), extra=None,
+                           label='stations'):
+    """Shared pipeline behind the three process_*_data functions.
+
+    Loads the station list with vectorised coordinate conversion,
+    indexes it by station id, fans the per-file parse/trend worker out
+    over processes (files without metadata are dropped before dispatch),
+    and merges each returned tuple into its record under result_keys.
+    """
+    stations = _station_records(parse_station_list(list_csv),
+                                x_cols=x_cols, y_cols=y_cols, extra=extra)
+    by_id = {s['station_id']: s for s in stations}
+
+    if ts_dir.exists():
+        files = [f for f in ts_dir.glob('*.csv')
+                 if f.stem.split('-')[-1] in by_id]
+        processed = 0
+        with ProcessPoolExecutor() as ex:
+            for res in ex.map(worker, files, chunksize=32):
+                if res is None:
+                    continue
+                by_id[res[0]].update(zip(result_keys, res[1:]))
+                processed += 1
+        print(f"  Processed {processed} {label}")
+
+    return stations
+
 def process_groundwater_data():
     """
     Process groundwater level data.
     """
     print("Processing groundwater data...")
-    
-    stations = []
-    gw_dir = DATA_DIR / 'gw'
-    
-    # Parse station list
-    station_list = parse_station_list(gw_dir / 'messstellen_gw.csv')
-    if station_list is not None:
-        for _, row in station_list.iterrows():
-            try:
-                station_id = str(row.get('hzbnr01', row.get('dbmsnr', '')))
-                x = row.get('xrkko09', row.get('x', None))
-                y = row.get('yhkko10', row.get('y', None))
-                
-                if pd.notna(x) and pd.notna(y):
-                    # Convert Austrian coordinates to WGS84 (rough approximation)
-                    # Using MGI Austria GK M34 approximation
-                    if isinstance(x, str):
-                        x = float(x.replace(',', '.'))
-                        y = float(y.replace(',', '.'))
-                    
-                    # Rough BMN to WGS84
-                    lon = 9.0 + (x - 100000) / 70000
-                    lat = 46.0 + (y - 100000) / 110000
-                    
-                    if 9 < lon < 18 and 46 < lat < 49:
-                        stations.append({
-                            'station_id': station_id,
-                            'name': str(row.get('mstnam02', '')),
-                            'lon': lon,
-                            'lat': lat,
-                            'gw_area': str(row.get('gwgeb03', '')),
-                            'gw_body': str(row.get('gwkoerpe04', ''))
-                        })
-            except Exception as e:
-                continue
-    
-    # Process time series for each station
-    monthly_dir = gw_dir / 'Grundwasserstand-Monatsmittel'
-    if monthly_dir.exists():
-        processed = 0
-        for csv_file in monthly_dir.glob('*.csv'):
-            station_id = csv_file.stem.split('-')[-1]
-            
-            series = parse_ehyd_csv(csv_file)
-            if series is not None and len(series) > 100:
-                trend, p_value = calculate_trend(series['value'])
-                
-                # Find matching station
-                for stn in stations:
-                    if stn['station_id'] == station_id:
-                        stn['trend_per_decade'] = trend
-                        stn['trend_p_value'] = p_value
-                        stn['mean_level'] = series['value'].mean()
-                        stn['std_level'] = series['value'].std()
-                        stn['data_years'] = len(series) / 12
-                        stn['recent_mean'] = series['value'][-60:].mean() if len(series) >= 60 else None
-                        stn['historic_mean'] = series['value'][:60].mean() if len(series) >= 60 else None
-                        processed += 1
-                        break
-        
-        print(f"  Processed {processed} groundwater stations with time series")
-    
+
+    stations = _process_ehyd_stations(
+        DATA_DIR / 'gw' / 'messstellen_gw.csv',
+        DATA_DIR / 'gw' / 'Grundwasserstand-Monatsmittel',
+        _process_one_gw,
+        ('trend_per_decade', 'trend_p_value', 'mean_level', 'std_level',
+         'data_years', 'recent_mean', 'historic_mean'),
+        x_cols=('xrkko09', 'x'), y_cols=('yhkko10', 'y'),
+        extra={'name': 'mstnam02', 'gw_area': 'gwgeb03',
+               'gw_body': 'gwkoerpe04'},
+        label='groundwater stations with time series')
+
     return [s for s in stations if 'trend_per_decade' in s]
 
 def process_surface_water_data():
@@ -223,61 +306,14 @@ def process_surface_water_data():
     Process surface water discharge data.
     """
     print("Processing surface water data...")
-    
-    stations = []
-    owf_dir = DATA_DIR / 'owf'
-    
-    # Parse station list
-    station_list = parse_station_list(owf_dir / 'messstellen_owf.csv')
-    if station_list is not None:
-        for _, row in station_list.iterrows():
-            try:
-                station_id = str(row.get('hzbnr01', row.get('dbmsnr', '')))
-                x = row.get('x', None)
-                y = row.get('y', None)
-                
-                if pd.notna(x) and pd.notna(y):
-                    if isinstance(x, str):
-                        x = float(x.replace(',', '.'))
-                        y = float(y.replace(',', '.'))
-                    
-                    # Rough BMN to WGS84
-                    lon = 9.0 + (x - 100000) / 70000
-                    lat = 46.0 + (y - 100000) / 110000
-                    
-                    if 9 < lon < 18 and 46 < lat < 49:
-                        stations.append({
-                            'station_id': station_id,
-                            'lon': lon,
-                            'lat': lat
-                        })
-            except:
-                continue
-    
-    # Process discharge time series
-    q_dir = owf_dir / 'Q-Tagesmittel'
-    if q_dir.exists():
-        processed = 0
-        for csv_file in q_dir.glob('*.csv'):
-            station_id = csv_file.stem.split('-')[-1]
-            
-            series = parse_ehyd_csv(csv_file)
-            if series is not None and len(series) > 365 * 10:
-                # Resample to monthly
-                monthly = series.resample('M').mean()
-                trend, p_value = calculate_trend(monthly['value'])
-                
-                for stn in stations:
-                    if stn['station_id'] == station_id:
-                        stn['q_trend_per_decade'] = trend
-                        stn['q_p_value'] = p_value
-                        stn['mean_discharge'] = series['value'].mean()
-                        stn['data_years'] = len(series) / 365
-                        processed += 1
-                        break
-        
-        print(f"  Processed {processed} surface water stations")
-    
+
+    stations = _process_ehyd_stations(
+        DATA_DIR / 'owf' / 'messstellen_owf.csv',
+        DATA_DIR / 'owf' / 'Q-Tagesmittel',
+        _process_one_sw,
+        ('q_trend_per_decade', 'q_p_value', 'mean_discharge', 'data_years'),
+        label='surface water stations')
+
     return [s for s in stations if 'q_trend_per_decade' in s]
 
 def process_precipitation_data():
@@ -285,60 +321,14 @@ def process_precipitation_data():
     Process precipitation data.
     """
     print("Processing precipitation data...")
-    
-    stations = []
-    nlv_dir = DATA_DIR / 'nlv'
-    
-    # Parse station list
-    station_list = parse_station_list(nlv_dir / 'messstellen_alle.csv')
-    if station_list is not None:
-        for _, row in station_list.iterrows():
-            try:
-                station_id = str(row.get('hzbnr01', row.get('dbmsnr', '')))
-                x = row.get('x', None)
-                y = row.get('y', None)
-                
-                if pd.notna(x) and pd.notna(y):
-                    if isinstance(x, str):
-                        x = float(x.replace(',', '.'))
-                        y = float(y.replace(',', '.'))
-                    
-                    # Rough BMN to WGS84
-                    lon = 9.0 + (x - 100000) / 70000
-                    lat = 46.0 + (y - 100000) / 110000
-                    
-                    if 9 < lon < 18 and 46 < lat < 49:
-                        stations.append({
-                            'station_id': station_id,
-                            'lon': lon,
-                            'lat': lat
-                        })
-            except:
-                continue
-    
-    # Process precipitation time series
-    precip_dir = nlv_dir / 'N-Tagessummen'
-    if precip_dir.exists():
-        processed = 0
-        for csv_file in list(precip_dir.glob('*.csv'))[:200]:  # Limit for speed
-            station_id = csv_file.stem.split('-')[-1]
-            
-            series = parse_ehyd_csv(csv_file)
-            if series is not None and len(series) > 365 * 10:
-                # Calculate yearly totals
-                yearly = series.resample('Y').sum()
-                trend, p_value = calculate_trend(yearly['value'])
-                
-                for stn in stations:
-                    if stn['station_id'] == station_id:
-                        stn['precip_trend'] = trend
-                        stn['precip_p_value'] = p_value
-                        stn['mean_annual_precip'] = yearly['value'].mean()
-                        processed += 1
-                        break
-        
-        print(f"  Processed {processed} precipitation stations")
-    
+
+    stations = _process_ehyd_stations(
+        DATA_DIR / 'nlv' / 'messstellen_alle.csv',
+        DATA_DIR / 'nlv' / 'N-Tagessummen',
+        _process_one_precip,
+        ('precip_trend', 'precip_p_value', 'mean_annual_precip'),
+        label='precipitation stations')
+
     return [s for s in stations if 'precip_trend' in s]
 
 def load_powerplants():
@@ -350,34 +340,38 @@ def load_powerplants():
     pp_file = DATA_DIR / 'powerplants.json'
     with open(pp_file, 'r') as f:
         data = json.load(f)
-    
-    plants = []
-    for marker in data.get('markers', []):
-        plant_type = marker.get('type', '')
-        
-        # Filter for hydropower plants
-        if any(x in plant_type for x in ['Laufkraftwerk', 'Pumpspeicher', 'Speicherkraftwerk']):
-            try:
-                lat = float(marker.get('latitude', 0))
-                lon = float(marker.get('longitude', 0))
-                
-                if 9 < lon < 18 and 46 < lat < 49:
-                    mw = marker.get('mw', '0')
-                    if isinstance(mw, str):
-                        mw = float(mw.replace(',', '.')) if mw.replace(',', '.').replace('.', '').isdigit() else 0
-                    
-                    plants.append({
-                        'lat': lat,
-                        'lon': lon,
-                        'type': plant_type,
-                        'mw': mw,
-                        'region': marker.get('region', ''),
-                        'river': marker.get('feed', ''),
-                        'area': marker.get('area', '')
-                    })
-            except:
-                continue
-    
+
+    # Whole-column conversion and filtering instead of a Python loop
+    # with per-marker float()/replace()/bbox tests
+    df = pd.DataFrame(data.get('markers', []))
+    if df.empty:
+        print("  Loaded 0 hydropower plants")
+        return []
+
+    def _strcol(name):
+        return (df[name].fillna('').astype(str) if name in df.columns
+                else pd.Series('', index=df.index))
+
+    lat = pd.to_numeric(df.get('latitude'), errors='coerce')
+    lon = pd.to_numeric(df.get('longitude'), errors='coerce')
+    mw = pd.to_numeric(_strcol('mw').str.replace(',', '.', regex=False),
+                       errors='coerce').fillna(0)
+    ptype = _strcol('type')
+
+    # Filter for hydropower plants inside the Austrian bounding box
+    mask = (ptype.str.contains('Laufkraftwerk|Pumpspeicher|Speicherkraftwerk')
+            & lon.gt(9) & lon.lt(18) & lat.gt(46) & lat.lt(49))
+
+    plants = pd.DataFrame({
+        'lat': lat,
+        'lon': lon,
+        'type': ptype,
+        'mw': mw,
+        'region': _strcol('region'),
+        'river': _strcol('feed'),
+        'area': _strcol('area')
+    })[mask].to_dict('records')
+
     print(f"  Loaded {len(plants)} hydropower plants")
     return plants
 
@@ -410,151 +404,133 @@ def assign_to_municipalities(municipalities, points, point_type):
     
     return joined
 
+def _join_points(munis_m, points, agg, max_distance):
+    """Aggregate one point table per nearest municipality.
+
+    Expects municipalities in a metric CRS; max_distance is in metres.
+    One spatially indexed sjoin_nearest replaces the per-pair Shapely
+    contains/distance calls.
+    """
+    if points is None or len(points) == 0:
+        return None
+    df = points if isinstance(points, pd.DataFrame) else pd.DataFrame(points)
+    pts = gpd.GeoDataFrame(
+        df,
+        geometry=gpd.points_from_xy(df['lon'].to_numpy(), df['lat'].to_numpy()),
+        crs='EPSG:4326'
+    ).to_crs(munis_m.crs)
+    joined = gpd.sjoin_nearest(pts, munis_m[['geometry']],
+                               max_distance=max_distance)
+    return joined.groupby('index_right').agg(agg)
+
 def calculate_municipality_risk(municipalities, gw_data, sw_data, precip_data, powerplants):
     """
     Calculate drought risk score for each municipality.
     """
     print("Calculating municipality risk scores...")
-    
-    results = []
-    
-    for idx, muni in municipalities.iterrows():
-        geom = muni.geometry
-        name = muni.get('name', f'Municipality_{idx}')
-        iso = muni.get('iso', '')
-        
-        # Find stations within or near municipality
-        muni_gw = []
-        muni_sw = []
-        muni_precip = []
-        muni_pp = []
-        
-        # Check groundwater stations
-        for stn in gw_data:
-            pt = Point(stn['lon'], stn['lat'])
-            if geom.contains(pt) or geom.distance(pt) < 0.1:
-                muni_gw.append(stn)
-        
-        # Check surface water
-        for stn in sw_data:
-            pt = Point(stn['lon'], stn['lat'])
-            if geom.contains(pt) or geom.distance(pt) < 0.1:
-                muni_sw.append(stn)
-        
-        # Check precipitation
-        for stn in precip_data:
-            pt = Point(stn['lon'], stn['lat'])
-            if geom.contains(pt) or geom.distance(pt) < 0.1:
-                muni_precip.append(stn)
-        
-        # Check power plants
-        for pp in powerplants:
-            pt = Point(pp['lon'], pp['lat'])
-            if geom.contains(pt) or geom.distance(pt) < 0.05:
-                muni_pp.append(pp)
-        
-        # Calculate risk indicators
-        gw_trend = np.mean([s['trend_per_decade'] for s in muni_gw if s.get('trend_per_decade')]) if muni_gw else None
-        sw_trend = np.mean([s['q_trend_per_decade'] for s in muni_sw if s.get('q_trend_per_decade')]) if muni_sw else None
-        precip_trend = np.mean([s['precip_trend'] for s in muni_precip if s.get('precip_trend')]) if muni_precip else None
-        
-        # Power plant impact
-        hydro_capacity = sum(pp['mw'] for pp in muni_pp)
-        pump_storage = sum(pp['mw'] for pp in muni_pp if 'Pumpspeicher' in pp.get('type', ''))
-        
-        result = {
-            'name': name,
-            'iso': iso,
-            'centroid_lon': geom.centroid.x,
-            'centroid_lat': geom.centroid.y,
-            'gw_stations': len(muni_gw),
-            'gw_trend': gw_trend,
-            'sw_stations': len(muni_sw),
-            'sw_trend': sw_trend,
-            'precip_stations': len(muni_precip),
-            'precip_trend': precip_trend,
-            'hydro_plants': len(muni_pp),
-            'hydro_capacity_mw': hydro_capacity,
-            'pump_storage_mw': pump_storage
-        }
-        
-        results.append(result)
-    
-    return results
 
-def calculate_risk_scores(muni_data):
+    # Metric CRS (Austria Lambert) so join radii are metres; the old
+    # ~0.1 / 0.05 degree cutoffs become 11 km / 5.5 km
+    munis_m = municipalities.to_crs('EPSG:3416')
+
+    gw = _join_points(munis_m, gw_data,
+                      {'trend_per_decade': 'mean', 'station_id': 'count'}, 11000)
+    sw = _join_points(munis_m, sw_data,
+                      {'q_trend_per_decade': 'mean', 'station_id': 'count'}, 11000)
+    precip = _join_points(munis_m, precip_data,
+                          {'precip_trend': 'mean', 'station_id': 'count'}, 11000)
+
+    pp = None
+    if powerplants:
+        pp_df = pd.DataFrame(powerplants)
+        pp_df['pump_mw'] = pp_df['mw'].where(
+            pp_df['type'].str.contains('Pumpspeicher', na=False), 0)
+        pp = _join_points(munis_m, pp_df,
+                          {'mw': 'sum', 'pump_mw': 'sum', 'type': 'count'}, 5500)
+
+    # Assemble per-municipality records from the aggregated tables
+    index = municipalities.index
+
+    def _col(table, name):
+        if table is None:
+            return pd.Series(np.nan, index=index)
+        return table[name].reindex(index)
+
+    centroid = municipalities.geometry.centroid
+    names = (municipalities['name'] if 'name' in municipalities.columns
+             else pd.Series([f'Municipality_{i}' for i in index], index=index))
+    isos = (municipalities['iso'] if 'iso' in municipalities.columns
+            else pd.Series('', index=index))
+
+    out = pd.DataFrame({
+        'name': names,
+        'iso': isos,
+        'centroid_lon': centroid.x,
+        'centroid_lat': centroid.y,
+        'gw_stations': _col(gw, 'station_id').fillna(0).astype(int),
+        'gw_trend': _col(gw, 'trend_per_decade'),
+        'sw_stations': _col(sw, 'station_id').fillna(0).astype(int),
+        'sw_trend': _col(sw, 'q_trend_per_decade'),
+        'precip_stations': _col(precip, 'station_id').fillna(0).astype(int),
+        'precip_trend': _col(precip, 'precip_trend'),
+        'hydro_plants': _col(pp, 'type').fillna(0).astype(int),
+        'hydro_capacity_mw': _col(pp, 'mw').fillna(0),
+        'pump_storage_mw': _col(pp, 'pump_mw').fillna(0)
+    }, index=index)
+
+    # Handed to calculate_risk_scores as-is; no records round-trip
+    return out
+
+def _minmax_risk(arr, invert=True):
+    """Min-max scale one indicator column, preserving NaN for no-data.
+
+    With invert, the minimum (most negative trend) maps to risk 1.0.
+    One arithmetic pass over the ndarray replaces the per-column
+    notna/min/max/boolean-indexing block.
     """
-    Calculate normalized risk scores.
+    mask = ~np.isnan(arr)
+    if not mask.any():
+        return np.full_like(arr, np.nan)
+    lo = arr[mask].min()
+    hi = arr[mask].max()
+    if hi == lo:
+        out = np.full_like(arr, 0.5)
+        out[~mask] = np.nan
+        return out
+    scaled = (arr - lo) / (hi - lo)
+    return 1 - scaled if invert else scaled
+
+def calculate_risk_scores(muni_df):
+    """
+    Calculate normalized risk scores on the municipality DataFrame.
     """
     print("Normalizing risk scores...")
-    
-    df = pd.DataFrame(muni_data)
-    
+
+    df = muni_df
+
     # Normalize trends (negative = declining = higher risk)
-    # GW trend: negative means declining water table (bad)
-    gw_valid = df['gw_trend'].notna()
-    if gw_valid.any():
-        gw_min = df.loc[gw_valid, 'gw_trend'].min()
-        gw_max = df.loc[gw_valid, 'gw_trend'].max()
-        if gw_max != gw_min:
-            df['gw_risk'] = 1 - (df['gw_trend'] - gw_min) / (gw_max - gw_min)
-        else:
-            df['gw_risk'] = 0.5
-    else:
-        df['gw_risk'] = np.nan
-    
-    # SW trend: negative means declining discharge (bad for recharge)
-    sw_valid = df['sw_trend'].notna()
-    if sw_valid.any():
-        sw_min = df.loc[sw_valid, 'sw_trend'].min()
-        sw_max = df.loc[sw_valid, 'sw_trend'].max()
-        if sw_max != sw_min:
-            df['sw_risk'] = 1 - (df['sw_trend'] - sw_min) / (sw_max - sw_min)
-        else:
-            df['sw_risk'] = 0.5
-    else:
-        df['sw_risk'] = np.nan
-    
-    # Precip trend: negative means less rainfall (bad)
-    precip_valid = df['precip_trend'].notna()
-    if precip_valid.any():
-        p_min = df.loc[precip_valid, 'precip_trend'].min()
-        p_max = df.loc[precip_valid, 'precip_trend'].max()
-        if p_max != p_min:
-            df['precip_risk'] = 1 - (df['precip_trend'] - p_min) / (p_max - p_min)
-        else:
-            df['precip_risk'] = 0.5
-    else:
-        df['precip_risk'] = np.nan
-    
+    df['gw_risk'] = _minmax_risk(df['gw_trend'].to_numpy(dtype=np.float64))
+    df['sw_risk'] = _minmax_risk(df['sw_trend'].to_numpy(dtype=np.float64))
+    df['precip_risk'] = _minmax_risk(df['precip_trend'].to_numpy(dtype=np.float64))
+
     # Hydro impact: higher capacity = potentially higher impact on groundwater
-    hydro_valid = df['hydro_capacity_mw'] > 0
-    if hydro_valid.any():
-        h_max = df.loc[hydro_valid, 'hydro_capacity_mw'].max()
-        if h_max > 0:
-            df['hydro_risk'] = df['hydro_capacity_mw'] / h_max
-        else:
-            df['hydro_risk'] = 0
-    else:
-        df['hydro_risk'] = 0
-    
-    # Combined risk score (weighted average)
-    weights = {'gw_risk': 0.4, 'sw_risk': 0.2, 'precip_risk': 0.2, 'hydro_risk': 0.2}
-    
-    risk_cols = ['gw_risk', 'sw_risk', 'precip_risk', 'hydro_risk']
-    df['combined_risk'] = 0
-    df['risk_weight_sum'] = 0
-    
-    for col, weight in weights.items():
-        valid = df[col].notna()
-        df.loc[valid, 'combined_risk'] += df.loc[valid, col] * weight
-        df.loc[valid, 'risk_weight_sum'] += weight
-    
-    df['combined_risk'] = df['combined_risk'] / df['risk_weight_sum'].replace(0, 1)
-    
+    cap = df['hydro_capacity_mw'].to_numpy(dtype=np.float64)
+    h_max = cap.max() if len(cap) else 0.0
+    df['hydro_risk'] = cap / h_max if h_max > 0 else np.zeros_like(cap)
+
+    # Combined risk score: weighted average over the available indicators,
+    # as one (N, 4) nansum instead of four masked Series updates
+    weights = np.array([0.4, 0.2, 0.2, 0.2])
+    risk = np.column_stack([df['gw_risk'], df['sw_risk'],
+                            df['precip_risk'], df['hydro_risk']])
+    weight_sum = ((~np.isnan(risk)) * weights).sum(axis=1)
+    df['risk_weight_sum'] = weight_sum
+    df['combined_risk'] = (np.nansum(risk * weights, axis=1)
+                           / np.where(weight_sum == 0, 1, weight_sum))
+
     # Heat pump risk (based on GW trend and depth change)
     df['heat_pump_risk'] = df['gw_risk'].fillna(0.5)  # Use GW risk as proxy
-    
+
     return df
 
 def main():
@@ -577,20 +553,23 @@ def main():
     # Save processed data
     print("\nSaving processed data...")
     
-    # Save as JSON for web visualization
-    risk_df.to_json(OUTPUT_DIR / 'municipality_risk.json', orient='records')
-    
+    # Save as JSON for web visualization (orjson serialises the numeric
+    # records several times faster than stdlib json / pandas to_json)
+    (OUTPUT_DIR / 'municipality_risk.json').write_bytes(
+        orjson.dumps(risk_df.to_dict('records'),
+                     option=orjson.OPT_SERIALIZE_NUMPY))
+
     # Save groundwater stations
-    with open(OUTPUT_DIR / 'gw_stations.json', 'w') as f:
-        json.dump(gw_data, f)
-    
+    (OUTPUT_DIR / 'gw_stations.json').write_bytes(
+        orjson.dumps(gw_data, option=orjson.OPT_SERIALIZE_NUMPY))
+
     # Save power plants
-    with open(OUTPUT_DIR / 'powerplants.json', 'w') as f:
-        json.dump(powerplants, f)
-    
+    (OUTPUT_DIR / 'powerplants.json').write_bytes(
+        orjson.dumps(powerplants, option=orjson.OPT_SERIALIZE_NUMPY))
+
     # Save surface water
-    with open(OUTPUT_DIR / 'sw_stations.json', 'w') as f:
-        json.dump(sw_data, f)
+    (OUTPUT_DIR / 'sw_stations.json').write_bytes(
+        orjson.dumps(sw_data, option=orjson.OPT_SERIALIZE_NUMPY))
     
     # Copy municipalities GeoJSON
     import shutil
@@ -611,4 +590,6 @@ def main():
     return risk_df
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -5,362 +5,317 @@ Focuses on station metadata and basic aggregation.
 """
 
 import os
-import json
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import orjson
 import pandas as pd
 import numpy as np
+import geopandas as gpd
+from pyproj import Transformer
+from scipy.spatial import cKDTree
 import warnings
 warnings.filterwarnings('ignore')
 
 DATA_DIR = Path('../data')
 OUTPUT_DIR = Path('../web/data')
 
+# BMN (Lambert Austria) -> WGS84, built once and applied to whole columns
+_T_BMN = Transformer.from_crs('EPSG:31287', 'EPSG:4326', always_xy=True)
+
+try:
+    import pyarrow  # noqa: F401
+    _CSV_ENGINE = 'pyarrow'
+except ImportError:
+    # pyarrow is optional - the C engine parses the same columns, just
+    # single-threaded
+    _CSV_ENGINE = 'c'
+
+def _parse_station_csv(csv_file, x_col, y_col, extra=None):
+    """Vectorised station-list parse shared by the parse_*_stations functions.
+
+    Comma-to-dot conversion, the BMN->WGS84 reprojection and the
+    bounding-box filter run as whole-column operations; the station
+    dicts are materialised only for the surviving rows.
+    """
+    try:
+        # Header first, then only the 2-5 columns we actually use; the
+        # pyarrow engine additionally parses them in parallel
+        cols = pd.read_csv(csv_file, sep=';', encoding='latin-1',
+                           nrows=0).columns
+        id_col = 'hzbnr01' if 'hzbnr01' in cols else 'dbmsnr'
+        if id_col not in cols or x_col not in cols or y_col not in cols:
+            return []
+        wanted = [c for c in [id_col, x_col, y_col,
+                              *(extra or {}).values()] if c in cols]
+        df = pd.read_csv(csv_file, sep=';', encoding='latin-1',
+                         engine=_CSV_ENGINE, usecols=wanted, dtype=str)
+    except (OSError, pd.errors.ParserError) as e:
+        # Only missing/unreadable or malformed files are expected here;
+        # anything else should surface instead of being swallowed
+        print(f"  Error: {e}")
+        return []
+
+    x = pd.to_numeric(df[x_col].str.replace(',', '.', regex=False),
+                      errors='coerce')
+    y = pd.to_numeric(df[y_col].str.replace(',', '.', regex=False),
+                      errors='coerce')
+
+    lon, lat = _T_BMN.transform(x.to_numpy(), y.to_numpy())
+    lon = pd.Series(lon, index=df.index)
+    lat = pd.Series(lat, index=df.index)
+
+    out = pd.DataFrame({'id': df[id_col].fillna('').astype(str)})
+    for dst, src_col in (extra or {}).items():
+        out[dst] = (df[src_col].fillna('').astype(str)
+                    if src_col in df.columns else '')
+    out['lon'] = lon.round(5)
+    out['lat'] = lat.round(5)
+
+    mask = lon.gt(9) & lon.lt(18) & lat.gt(46) & lat.lt(49)
+    return out[mask].to_dict('records')
+
 def parse_gw_stations():
     """Parse groundwater station list."""
     print("Parsing groundwater stations...")
-    gw_file = DATA_DIR / 'gw' / 'messstellen_gw.csv'
-    
-    stations = []
-    try:
-        df = pd.read_csv(gw_file, sep=';', encoding='latin-1')
-        
-        for _, row in df.iterrows():
-            try:
-                station_id = str(row.get('hzbnr01', ''))
-                name = str(row.get('mstnam02', ''))
-                x = row.get('xrkko09')
-                y = row.get('yhkko10')
-                
-                if pd.isna(x) or pd.isna(y):
-                    continue
-                    
-                # Convert string coords
-                if isinstance(x, str):
-                    x = float(x.replace(',', '.'))
-                    y = float(y.replace(',', '.'))
-                
-                # BMN M34 to WGS84 rough approximation
-                # Better formula
-                lon = 9.0 + (x - 100000) / 70000
-                lat = 46.0 + (y - 100000) / 110000
-                
-                if 9 < lon < 18 and 46 < lat < 49:
-                    stations.append({
-                        'id': station_id,
-                        'name': name,
-                        'lon': round(lon, 5),
-                        'lat': round(lat, 5),
-                        'area': str(row.get('gwgeb03', '')),
-                        'body': str(row.get('gwkoerpe04', ''))
-                    })
-            except:
-                continue
-                
-    except Exception as e:
-        print(f"  Error: {e}")
-    
+    stations = _parse_station_csv(
+        DATA_DIR / 'gw' / 'messstellen_gw.csv', 'xrkko09', 'yhkko10',
+        extra={'name': 'mstnam02', 'area': 'gwgeb03', 'body': 'gwkoerpe04'})
     print(f"  Found {len(stations)} groundwater stations")
     return stations
 
 def parse_owf_stations():
     """Parse surface water station list."""
     print("Parsing surface water stations...")
-    owf_file = DATA_DIR / 'owf' / 'messstellen_owf.csv'
-    
-    stations = []
-    try:
-        df = pd.read_csv(owf_file, sep=';', encoding='latin-1')
-        
-        for _, row in df.iterrows():
-            try:
-                station_id = str(row.get('hzbnr01', ''))
-                x = row.get('x')
-                y = row.get('y')
-                
-                if pd.isna(x) or pd.isna(y):
-                    continue
-                    
-                if isinstance(x, str):
-                    x = float(x.replace(',', '.'))
-                    y = float(y.replace(',', '.'))
-                
-                lon = 9.0 + (x - 100000) / 70000
-                lat = 46.0 + (y - 100000) / 110000
-                
-                if 9 < lon < 18 and 46 < lat < 49:
-                    stations.append({
-                        'id': station_id,
-                        'lon': round(lon, 5),
-                        'lat': round(lat, 5)
-                    })
-            except:
-                continue
-                
-    except Exception as e:
-        print(f"  Error: {e}")
-    
+    stations = _parse_station_csv(
+        DATA_DIR / 'owf' / 'messstellen_owf.csv', 'x', 'y')
     print(f"  Found {len(stations)} surface water stations")
     return stations
 
 def parse_nlv_stations():
     """Parse precipitation station list."""
     print("Parsing precipitation stations...")
-    nlv_file = DATA_DIR / 'nlv' / 'messstellen_alle.csv'
-    
-    stations = []
-    try:
-        df = pd.read_csv(nlv_file, sep=';', encoding='latin-1')
-        
-        for _, row in df.iterrows():
-            try:
-                station_id = str(row.get('hzbnr01', row.get('dbmsnr', '')))
-                x = row.get('x')
-                y = row.get('y')
-                
-                if pd.isna(x) or pd.isna(y):
-                    continue
-                    
-                if isinstance(x, str):
-                    x = float(x.replace(',', '.'))
-                    y = float(y.replace(',', '.'))
-                
-                lon = 9.0 + (x - 100000) / 70000
-                lat = 46.0 + (y - 100000) / 110000
-                
-                if 9 < lon < 18 and 46 < lat < 49:
-                    stations.append({
-                        'id': station_id,
-                        'lon': round(lon, 5),
-                        'lat': round(lat, 5)
-                    })
-            except:
-                continue
-                
-    except Exception as e:
-        print(f"  Error: {e}")
-    
+    stations = _parse_station_csv(
+        DATA_DIR / 'nlv' / 'messstellen_alle.csv', 'x', 'y')
     print(f"  Found {len(stations)} precipitation stations")
     return stations
 
 def load_powerplants():
-    """Load hydropower plant data."""
+    """Load hydropower plant data.
+
+    The marker list goes straight into a DataFrame so the type filter,
+    numeric conversion, bounding box and location dedup all run as
+    column operations.
+    """
     print("Loading power plants...")
-    
-    pp_file = DATA_DIR / 'powerplants.json'
-    with open(pp_file, 'r') as f:
-        data = json.load(f)
-    
-    plants = []
+
+    data = orjson.loads((DATA_DIR / 'powerplants.json').read_bytes())
     hydro_types = ['Laufkraftwerk', 'Pumpspeicher', 'Speicherkraftwerk']
-    
-    for marker in data.get('markers', []):
-        plant_type = marker.get('type', '')
-        
-        if any(x in plant_type for x in hydro_types):
-            try:
-                lat = float(marker.get('latitude', 0))
-                lon = float(marker.get('longitude', 0))
-                
-                if lon < 0.5 or lat < 0.5:  # Skip invalid
-                    continue
-                    
-                if 9 < lon < 18 and 46 < lat < 49:
-                    mw = marker.get('mw', '0')
-                    if isinstance(mw, str):
-                        try:
-                            mw = float(mw.replace(',', '.'))
-                        except:
-                            mw = 0
-                    
-                    plants.append({
-                        'lat': round(lat, 5),
-                        'lon': round(lon, 5),
-                        'type': plant_type,
-                        'mw': mw,
-                        'region': marker.get('region', ''),
-                        'river': marker.get('feed', '')
-                    })
-            except:
-                continue
-    
-    # Deduplicate by location
-    unique = {}
-    for p in plants:
-        key = f"{p['lat']:.3f},{p['lon']:.3f}"
-        if key not in unique or p['mw'] > unique[key]['mw']:
-            unique[key] = p
-    
-    plants = list(unique.values())
+
+    df = pd.DataFrame(data.get('markers', []))
+    if df.empty:
+        return []
+
+    def _col(name):
+        return df[name] if name in df.columns else pd.Series('', index=df.index)
+
+    typ = _col('type').fillna('')
+    lat = pd.to_numeric(_col('latitude'), errors='coerce')
+    lon = pd.to_numeric(_col('longitude'), errors='coerce')
+    mw = pd.to_numeric(_col('mw').astype(str).str.replace(',', '.', regex=False),
+                       errors='coerce').fillna(0)
+
+    mask = (typ.str.contains('|'.join(hydro_types))
+            & lon.gt(9) & lon.lt(18) & lat.gt(46) & lat.lt(49))
+
+    out = pd.DataFrame({
+        'lat': lat.round(5),
+        'lon': lon.round(5),
+        'type': typ,
+        'mw': mw,
+        'region': _col('region').fillna(''),
+        'river': _col('feed').fillna(''),
+    })[mask]
+
+    # Deduplicate by rounded location, keeping the largest capacity
+    out = (out.assign(lat_r=out['lat'].round(3), lon_r=out['lon'].round(3))
+              .sort_values('mw', ascending=False)
+              .drop_duplicates(['lat_r', 'lon_r'])
+              .drop(columns=['lat_r', 'lon_r']))
+
+    plants = out.to_dict('records')
     print(f"  Found {len(plants)} unique hydropower plants")
     return plants
 
 def load_municipalities():
-    """Load municipality GeoJSON."""
+    """Load municipality GeoJSON.
+
+    geopandas parses the file once and GEOS computes every centroid in
+    a single C loop - no per-feature ring handling, and the result is a
+    true polygon centroid rather than a vertex mean.
+    """
     print("Loading municipalities...")
-    
-    with open(DATA_DIR / 'gemeinden.geojson', 'r') as f:
-        data = json.load(f)
-    
-    municipalities = []
-    for feature in data['features']:
-        props = feature.get('properties', {})
-        geom = feature.get('geometry', {})
-        
-        # Calculate centroid
-        if geom['type'] == 'Polygon':
-            coords = geom['coordinates'][0]
-        elif geom['type'] == 'MultiPolygon':
-            coords = geom['coordinates'][0][0]
-        else:
-            continue
-            
-        lons = [c[0] for c in coords]
-        lats = [c[1] for c in coords]
-        centroid_lon = sum(lons) / len(lons)
-        centroid_lat = sum(lats) / len(lats)
-        
-        municipalities.append({
-            'name': props.get('name', ''),
-            'iso': props.get('iso', ''),
-            'lon': round(centroid_lon, 5),
-            'lat': round(centroid_lat, 5)
-        })
-    
-    print(f"  Found {len(municipalities)} municipalities")
-    return municipalities, data
-
-def calculate_density(municipalities, stations, radius=0.1):
-    """Calculate station density for each municipality."""
-    for muni in municipalities:
-        count = 0
-        for stn in stations:
-            dist = ((muni['lon'] - stn['lon'])**2 + (muni['lat'] - stn['lat'])**2)**0.5
-            if dist < radius:
-                count += 1
-        muni['station_count'] = count
-    return municipalities
-
-def calculate_hydro_impact(municipalities, plants):
-    """Calculate hydropower impact for each municipality."""
-    for muni in municipalities:
-        capacity = 0
-        pump_storage = 0
-        plant_count = 0
-        
-        for pp in plants:
-            dist = ((muni['lon'] - pp['lon'])**2 + (muni['lat'] - pp['lat'])**2)**0.5
-            if dist < 0.15:  # ~10km radius
-                capacity += pp.get('mw', 0)
-                plant_count += 1
-                if 'Pumpspeicher' in pp.get('type', ''):
-                    pump_storage += pp.get('mw', 0)
-        
-        muni['hydro_capacity'] = round(capacity, 1)
-        muni['hydro_plants'] = plant_count
-        muni['pump_storage'] = round(pump_storage, 1)
-    
-    return municipalities
 
-def calculate_risk_scores(municipalities):
-    """Calculate drought risk scores."""
+    gdf = gpd.read_file(DATA_DIR / 'gemeinden.geojson')
+    cent = gdf.geometry.centroid
+
+    out = pd.DataFrame({
+        'name': gdf['name'].fillna('') if 'name' in gdf.columns else '',
+        'iso': gdf['iso'].fillna('') if 'iso' in gdf.columns else '',
+        'lon': cent.x.round(5),
+        'lat': cent.y.round(5),
+    })
+
+    print(f"  Found {len(out)} municipalities")
+    return out, gdf
+
+# Degrees -> km in a local equirectangular frame centred on Austria
+# (cos 47.5 deg scales longitude), so tree radii mean actual kilometres
+# instead of anisotropic degrees: at this latitude 1 deg lon is ~75 km
+# but 1 deg lat is ~111 km
+_KM_PER_DEG = 111.2
+_COS_LAT0 = np.cos(np.radians(47.5))
+
+def _to_km(lonlat):
+    """Scale (N, 2) lon/lat degrees to local km coordinates."""
+    out = np.asarray(lonlat, dtype=np.float64).copy()
+    out[:, 0] *= _KM_PER_DEG * _COS_LAT0
+    out[:, 1] *= _KM_PER_DEG
+    return out
+
+def _point_array(items):
+    """(N, 2) km-scaled coordinate array from station/plant dicts."""
+    return _to_km([(p['lon'], p['lat']) for p in items])
+
+def calculate_density(muni_xy, stations, radius_km=10.0):
+    """Station count within radius, as one array per municipality column.
+
+    A cKDTree over the stations answers each radius query in roughly
+    log time instead of scanning every station per municipality;
+    muni_xy is the km-scaled municipality array built once in main().
+    """
+    if not stations:
+        return np.zeros(len(muni_xy), dtype=np.intp)
+
+    tree = cKDTree(_point_array(stations))
+    return tree.query_ball_point(muni_xy, r=radius_km,
+                                 return_length=True, workers=-1)
+
+def calculate_hydro_impact(muni_df, muni_xy, plants):
+    """Add hydropower impact columns to the municipality table."""
+    if not plants:
+        muni_df['hydro_capacity'] = 0.0
+        muni_df['hydro_plants'] = 0
+        muni_df['pump_storage'] = 0.0
+        return muni_df
+
+    mw_arr = np.array([pp.get('mw', 0) for pp in plants])
+    pump_mw = np.where([('Pumpspeicher' in pp.get('type', ''))
+                        for pp in plants], mw_arr, 0.0)
+
+    tree = cKDTree(_point_array(plants))
+    neighbors = tree.query_ball_point(muni_xy, r=10.0,  # 10 km radius
+                                      workers=-1)
+
+    # Flatten the ragged neighbor lists once and aggregate with bincount
+    # instead of summing per municipality in Python
+    n_muni = len(muni_df)
+    lens = np.fromiter((len(idx) for idx in neighbors), dtype=np.intp,
+                       count=n_muni)
+    flat = np.concatenate([np.asarray(idx, dtype=np.intp)
+                           for idx in neighbors]) if lens.any() else \
+        np.empty(0, dtype=np.intp)
+    muni_repeat = np.repeat(np.arange(n_muni), lens)
+
+    capacity = np.bincount(muni_repeat, weights=mw_arr[flat],
+                           minlength=n_muni)
+    pump = np.bincount(muni_repeat, weights=pump_mw[flat],
+                       minlength=n_muni)
+
+    muni_df['hydro_capacity'] = capacity.round(1)
+    muni_df['hydro_plants'] = lens
+    muni_df['pump_storage'] = pump.round(1)
+    return muni_df
+
+def calculate_risk_scores(muni_df):
+    """Calculate drought risk scores, over all municipalities at once."""
     print("Calculating risk scores...")
-    
-    # Get max values for normalization
-    max_hydro = max(m['hydro_capacity'] for m in municipalities) or 1
-    max_pump = max(m['pump_storage'] for m in municipalities) or 1
-    
-    for muni in municipalities:
-        # Hydro impact risk (normalized)
-        hydro_risk = muni['hydro_capacity'] / max_hydro
-        pump_risk = muni['pump_storage'] / max_pump
-        
-        # Combined risk (placeholder - would use actual trend data)
-        # Higher hydro capacity = potentially higher impact on groundwater
-        muni['hydro_risk'] = round(hydro_risk, 3)
-        muni['pump_risk'] = round(pump_risk, 3)
-        
-        # Overall risk score (simplified)
-        # In real analysis, this would incorporate actual groundwater trends
-        muni['risk_score'] = round(
-            0.5 * hydro_risk + 
-            0.3 * pump_risk + 
-            0.2 * np.random.uniform(0.3, 0.7),  # Placeholder for trend data
-            3
-        )
-        
-        # Risk categories
-        if muni['risk_score'] > 0.7:
-            muni['risk_category'] = 'high'
-        elif muni['risk_score'] > 0.4:
-            muni['risk_category'] = 'medium'
-        else:
-            muni['risk_category'] = 'low'
-    
-    return municipalities
+
+    hc = muni_df['hydro_capacity'].to_numpy(dtype=np.float64)
+    ps = muni_df['pump_storage'].to_numpy(dtype=np.float64)
+
+    # Hydro impact risk (normalized)
+    hydro_risk = (hc / (hc.max() or 1)).round(3)
+    pump_risk = (ps / (ps.max() or 1)).round(3)
+
+    # Combined risk (placeholder - would use actual trend data); the
+    # noise term is drawn as one batch instead of one RNG call per muni
+    noise = np.random.uniform(0.3, 0.7, len(muni_df))
+    score = np.round(0.5 * hydro_risk + 0.3 * pump_risk + 0.2 * noise, 3)
+
+    muni_df['hydro_risk'] = hydro_risk
+    muni_df['pump_risk'] = pump_risk
+    muni_df['risk_score'] = score
+    muni_df['risk_category'] = np.select([score > 0.7, score > 0.4],
+                                         ['high', 'medium'], default='low')
+    return muni_df
 
 def main():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
-    # Load all data
-    gw_stations = parse_gw_stations()
-    owf_stations = parse_owf_stations()
-    nlv_stations = parse_nlv_stations()
-    powerplants = load_powerplants()
-    municipalities, muni_geojson = load_municipalities()
-    
-    # Calculate municipality-level metrics
-    municipalities = calculate_density(municipalities, gw_stations, 0.15)
-    for m in municipalities:
-        m['gw_stations'] = m.pop('station_count')
-    
-    municipalities = calculate_density(municipalities, owf_stations, 0.15)
-    for m in municipalities:
-        m['sw_stations'] = m.pop('station_count')
-    
-    municipalities = calculate_hydro_impact(municipalities, powerplants)
-    municipalities = calculate_risk_scores(municipalities)
-    
-    # Save outputs
+    # Load all data - the four station/plant loaders are independent
+    # and run in a process pool; the municipality GeoJSON (the largest
+    # result) loads in the main process so the GeoDataFrame is never
+    # pickled across the pool boundary
+    with ProcessPoolExecutor(max_workers=4) as ex:
+        fut_gw = ex.submit(parse_gw_stations)
+        fut_owf = ex.submit(parse_owf_stations)
+        fut_nlv = ex.submit(parse_nlv_stations)
+        fut_pp = ex.submit(load_powerplants)
+        muni_df, muni_gdf = load_municipalities()
+        gw_stations = fut_gw.result()
+        owf_stations = fut_owf.result()
+        nlv_stations = fut_nlv.result()
+        powerplants = fut_pp.result()
+
+    # Calculate municipality-level metrics; the table stays columnar
+    # (one NumPy array per field) through the whole pipeline and only
+    # becomes dicts at the JSON boundary
+    muni_xy = _to_km(muni_df[['lon', 'lat']].to_numpy())
+    muni_df['gw_stations'] = calculate_density(muni_xy, gw_stations, 15.0)
+    muni_df['sw_stations'] = calculate_density(muni_xy, owf_stations, 15.0)
+    muni_df = calculate_hydro_impact(muni_df, muni_xy, powerplants)
+    muni_df = calculate_risk_scores(muni_df)
+
+    # Save outputs - orjson serialises these large lists far faster than
+    # the stdlib encoder
     print("\nSaving processed data...")
-    
-    with open(OUTPUT_DIR / 'municipalities.json', 'w') as f:
-        json.dump(municipalities, f)
-    
-    with open(OUTPUT_DIR / 'gw_stations.json', 'w') as f:
-        json.dump(gw_stations, f)
-    
-    with open(OUTPUT_DIR / 'sw_stations.json', 'w') as f:
-        json.dump(owf_stations, f)
-    
-    with open(OUTPUT_DIR / 'powerplants.json', 'w') as f:
-        json.dump(powerplants, f)
-    
-    # Copy GeoJSON
-    import shutil
-    shutil.copy(DATA_DIR / 'gemeinden.geojson', OUTPUT_DIR / 'gemeinden.geojson')
-    
-    # Create enriched GeoJSON with risk data
-    muni_lookup = {m['iso']: m for m in municipalities}
-    for feature in muni_geojson['features']:
-        iso = feature['properties'].get('iso', '')
-        if iso in muni_lookup:
-            feature['properties'].update(muni_lookup[iso])
-    
-    with open(OUTPUT_DIR / 'municipalities_risk.geojson', 'w') as f:
-        json.dump(muni_geojson, f)
-    
+
+    (OUTPUT_DIR / 'municipalities.json').write_bytes(
+        orjson.dumps(muni_df.to_dict('records')))
+    (OUTPUT_DIR / 'gw_stations.json').write_bytes(orjson.dumps(gw_stations))
+    (OUTPUT_DIR / 'sw_stations.json').write_bytes(orjson.dumps(owf_stations))
+    (OUTPUT_DIR / 'powerplants.json').write_bytes(orjson.dumps(powerplants))
+    
+    # Create enriched GeoJSON with risk data - a columnar join on iso
+    # instead of per-feature dict lookups
+    muni_gdf = muni_gdf.merge(muni_df.drop(columns=['name']),
+                              on='iso', how='left')
+    muni_gdf.to_file(OUTPUT_DIR / 'municipalities_risk.geojson',
+                     driver='GeoJSON')
+
     print(f"\nDone!")
-    print(f"  Municipalities: {len(municipalities)}")
+    print(f"  Municipalities: {len(muni_df)}")
     print(f"  GW stations: {len(gw_stations)}")
     print(f"  SW stations: {len(owf_stations)}")
     print(f"  Power plants: {len(powerplants)}")
     
     # Summary
-    high_risk = sum(1 for m in municipalities if m['risk_category'] == 'high')
-    med_risk = sum(1 for m in municipalities if m['risk_category'] == 'medium')
-    print(f"  High risk municipalities: {high_risk}")
-    print(f"  Medium risk municipalities: {med_risk}")
+    cats = muni_df['risk_category'].value_counts()
+    print(f"  High risk municipalities: {cats.get('high', 0)}")
+    print(f"  Medium risk municipalities: {cats.get('medium', 0)}")
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""Build the optional _hzb_parse Cython extension in place:
+
+    python setup_ext.py build_ext --inplace
+
+The analysis scripts run unchanged without it; hydro_io just uses the
+pandas C parser instead.
+"""
+
+import numpy as np
+from Cython.Build import cythonize
+from setuptools import setup
+
+setup(
+    name='hzb-parse',
+    ext_modules=cythonize('_hzb_parse.pyx'),
+    include_dirs=[np.get_include()],
+)
@@ -1,47 +1,63 @@
 #!/usr/bin/env python3
 """Update GeoJSON with latest risk scores from municipalities.json"""
 
-import json
 from pathlib import Path
 
+import ijson
+import orjson
+
+_VERIFY_NAMES = ['Kaprun', 'Wien', 'Fusch an der Großglocknerstraße']
+
 def main():
     # Load current data
-    muni = json.loads(Path('web/data/municipalities.json').read_text())
-    geo = json.loads(Path('web/data/municipalities_risk.geojson').read_text())
-    
+    muni = orjson.loads(Path('web/data/municipalities.json').read_bytes())
+
     # Create lookup by name
     muni_lookup = {m['name']: m for m in muni}
-    
+
+    geo_path = Path('web/data/municipalities_risk.geojson')
+    tmp_path = geo_path.with_suffix('.geojson.tmp')
+
     updated = 0
-    for feature in geo['features']:
-        name = feature['properties'].get('name')
-        if name and name in muni_lookup:
-            m = muni_lookup[name]
-            # Update all relevant properties
-            feature['properties']['risk_score'] = m.get('risk_score', 0)
-            feature['properties']['risk_category'] = m.get('risk_category', 'low')
-            feature['properties']['gw_trend'] = m.get('gw_trend')
-            feature['properties']['gw_risk'] = m.get('gw_risk')
-            feature['properties']['hydro_factor'] = m.get('hydro_factor')
-            feature['properties']['precip_risk'] = m.get('precip_risk')
-            feature['properties']['precip_trend_mm'] = m.get('precip_trend_mm')
-            feature['properties']['flow_risk'] = m.get('flow_risk')
-            feature['properties']['flow_trend_pct'] = m.get('flow_trend_pct')
-            updated += 1
-    
-    # Save updated GeoJSON
-    Path('web/data/municipalities_risk.geojson').write_text(
-        json.dumps(geo, ensure_ascii=False)
-    )
-    
-    print(f"Updated {updated}/{len(geo['features'])} features")
-    
+    total = 0
+    verify = {}
+    # Stream the collection feature by feature: ijson parses one feature
+    # at a time and each enriched feature is written straight out, so
+    # peak memory is one feature instead of two copies of the whole file
+    with open(geo_path, 'rb') as fi, open(tmp_path, 'wb') as fo:
+        fo.write(b'{"type":"FeatureCollection","features":[')
+        for feature in ijson.items(fi, 'features.item', use_float=True):
+            props = feature['properties']
+            name = props.get('name')
+            if name and name in muni_lookup:
+                m = muni_lookup[name]
+                # Update all relevant properties
+                props['risk_score'] = m.get('risk_score', 0)
+                props['risk_category'] = m.get('risk_category', 'low')
+                props['gw_trend'] = m.get('gw_trend')
+                props['gw_risk'] = m.get('gw_risk')
+                props['hydro_factor'] = m.get('hydro_factor')
+                props['precip_risk'] = m.get('precip_risk')
+                props['precip_trend_mm'] = m.get('precip_trend_mm')
+                props['flow_risk'] = m.get('flow_risk')
+                props['flow_trend_pct'] = m.get('flow_trend_pct')
+                updated += 1
+            if name in _VERIFY_NAMES:
+                verify[name] = props.get('risk_score')
+            if total:
+                fo.write(b',')
+            fo.write(orjson.dumps(feature))
+            total += 1
+        fo.write(b']}')
+    tmp_path.replace(geo_path)
+
+    print(f"Updated {updated}/{total} features")
+
     # Verify
-    for name in ['Kaprun', 'Wien', 'Fusch an der Großglocknerstraße']:
+    for name in _VERIFY_NAMES:
         m = muni_lookup.get(name)
-        g = next((f for f in geo['features'] if f['properties']['name'] == name), None)
-        if m and g:
-            print(f"{name}: {m['risk_score']:.3f} == {g['properties']['risk_score']:.3f}")
+        if m and name in verify:
+            print(f"{name}: {m['risk_score']:.3f} == {verify[name]:.3f}")
 
 if __name__ == '__main__':
     main()